@@ -0,0 +1,65 @@
+"""
+Times the diff_finder backends on the largest before/after pairs of the
+dataset and checks which ones reproduce the 'difflib' records exactly.
+
+usage: python benchmarks/bench_diff.py [--top 20] [--repeat 3]
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_finder import DIFF_BACKENDS, SIMILARITY_BACKENDS, fuzz, text_diff_analysis, text_diff_compact  # noqa: E402
+
+DEFAULT_CSV = "input/python/treated_python_commits.csv"
+
+
+def load_largest_pairs(csv_path, top):
+    csv.field_size_limit(sys.maxsize)
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        pairs = [(row["before"], row["after"]) for row in csv.DictReader(f)]
+    pairs.sort(key=lambda pair: len(pair[0]) + len(pair[1]), reverse=True)
+    return pairs[:top]
+
+
+def run(pairs, backend, similarity, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [text_diff_analysis(old, new, backend=backend, similarity=similarity) for old, new in pairs]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return results, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark diff_finder backends.")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help=f"Dataset (default: {DEFAULT_CSV})")
+    parser.add_argument("--top", type=int, default=20, help="Number of largest pairs to diff (default: 20).")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration; the best is kept.")
+    args = parser.parse_args()
+
+    pairs = load_largest_pairs(args.csv, args.top)
+    lines = sum(len(old.splitlines()) + len(new.splitlines()) for old, new in pairs)
+    print(f"Diffing the {len(pairs)} largest pairs of '{args.csv}' ({lines} lines)")
+
+    similarities = [name for name in SIMILARITY_BACKENDS if name != "rapidfuzz" or fuzz is not None]
+    reference, reference_time = run(pairs, "difflib", "difflib", args.repeat)
+    print(f"  {'backend':<10} {'similarity':<10} {'time':>9} {'speedup':>8}  records")
+    for backend in DIFF_BACKENDS:
+        for similarity in similarities:
+            results, elapsed = run(pairs, backend, similarity, args.repeat)
+            same = "identical" if results == reference else "differ"
+            print(f"  {backend:<10} {similarity:<10} {elapsed:8.3f}s {reference_time / elapsed:7.2f}x  {same}")
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        compact = [text_diff_compact(old, new, skip_equal=True) for old, new in pairs]
+    elapsed = (time.perf_counter() - start) / args.repeat
+    changed = sum(len(diff) for diff in compact)
+    print(f"  compact, equal runs skipped: {elapsed:8.3f}s {reference_time / elapsed:7.2f}x  ({changed} records kept)")
+    if fuzz is None:
+        print("  (install rapidfuzz to include the C-accelerated similarity)")
@@ -0,0 +1,87 @@
+"""
+Times parser.process_directory on a synthetic tree of model completions,
+against the previous regex extractor, and checks both produce the same files.
+
+usage: python benchmarks/bench_parser.py [--files 2000] [--jobs 4]
+"""
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import process_directory  # noqa: E402
+
+DEFAULT_CSV = "input/python/treated_python_commits.csv"
+
+
+def regex_process_directory(input_dir, output_dir):
+    # Previous implementation: every block is written in turn, so the last one survives.
+    for root, _, files in os.walk(input_dir):
+        for filename in files:
+            with open(os.path.join(root, filename), "r", encoding="utf-8") as f:
+                content = f.read()
+            matches = re.findall(r"```(?:\w+)?\s*(.*?)```", content, re.DOTALL)
+            blocks = [m.strip() for m in matches] if matches else [content]
+            target_dir = os.path.join(output_dir, os.path.relpath(root, input_dir))
+            os.makedirs(target_dir, exist_ok=True)
+            for block in blocks:
+                with open(os.path.join(target_dir, f"{filename}.txt"), "w", encoding="utf-8") as out:
+                    out.write(block)
+
+
+def make_tree(directory, files):
+    from dataset import load_dataset
+
+    snippets = load_dataset(DEFAULT_CSV).column("code_after")
+    for i in range(files):
+        code = snippets[i % len(snippets)]
+        text = (
+            f"Here is the migrated code:\n\n```python\n{code}\n```\n\n"
+            f"Changes: replaced the legacy calls.\n\n```\n{code[:200]}\n```\nDone.\n"
+        )
+        folder = os.path.join(directory, f"repo{i % 50}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"python_a_b{i}"), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+def timed(label, fn, files):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {elapsed:8.3f}s  ({files / elapsed:8.0f} files/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parser.py on a synthetic output tree.")
+    parser.add_argument("--files", type=int, default=2000, help="Number of completions to generate.")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Workers for the parallel run.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        raw, parsed = os.path.join(tmp, "raw"), os.path.join(tmp, "parsed")
+        make_tree(raw, args.files)
+        print(f"Extracting code from {args.files} synthetic completions")
+
+        reference = os.path.join(tmp, "parsed_regex")
+        timed("regex (previous)", lambda: regex_process_directory(raw, reference), args.files)
+        timed("scanner, 1 job", lambda: process_directory(raw, parsed, jobs=1, force=True), args.files)
+        timed(f"scanner, {args.jobs} jobs", lambda: process_directory(raw, parsed, jobs=args.jobs, force=True),
+              args.files)
+        timed("re-run, outputs up to date", lambda: process_directory(raw, parsed, jobs=args.jobs), args.files)
+
+        mismatches = 0
+        for root, _, names in os.walk(reference):
+            for name in names:
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as a, \
+                        open(os.path.join(parsed, os.path.relpath(path, reference)), encoding="utf-8") as b:
+                    mismatches += a.read() != b.read()
+        if mismatches:
+            print(f"  WARNING: {mismatches} extracted files differ from the regex extractor")
+            sys.exit(1)
+        print("  extracted code is identical")
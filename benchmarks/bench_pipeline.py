@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark of the pipeline itself, with inference replaced by the
+fake LLM server: run_migrations.py (-> main.py -> client ->
+save_result_to_file), then parser.py, then get_codebleu_metric.py, each run
+as its own process in a scratch directory. The dataset is synthesized by
+replicating treated_python_commits.csv up to --rows rows.
+
+For every stage it reports wall time, model requests per second, peak RSS
+and files written, so orchestration regressions and concurrency settings
+can be checked without paying for real inference.
+
+usage: python benchmarks/bench_pipeline.py [--rows 200] [--model ollama|gpt] [--jobs 4]
+                                           [--async | --subprocess] [--stream]
+                                           [--latency 0.05] [--token-latency 0.0]
+                                           [--stages migrate parse score] [--json results.json]
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_llm_server import FakeLLMServer, split_tokens  # noqa: E402
+
+DEFAULT_CSV = os.path.join("input", "python", "treated_python_commits.csv")
+DATASET_NAME = "bench.csv"
+STAGES = ("migrate", "parse", "score")
+# Number of templates run_migrations.py runs per row
+TEMPLATE_COUNT = 3
+REQUEST_COUNTERS = ("chat", "openai_chat")
+
+
+def synthesize_dataset(source_csv, target_csv, rows):
+    """Writes the first `rows` rows of `source_csv` repeated over and over; returns the row count."""
+    csv.field_size_limit(sys.maxsize)
+    with open(source_csv, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        records = list(reader)
+    if not records:
+        raise ValueError(f"'{source_csv}' has no rows to replicate")
+    # Output files are named after the row id (dataset.py numbers rows without an 'id'),
+    # so every copy is renumbered to get its own file.
+    id_column = header.index("id") if "id" in header else None
+    os.makedirs(os.path.dirname(target_csv), exist_ok=True)
+    with open(target_csv, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for n in range(rows):
+            record = records[n % len(records)]
+            if id_column is not None:
+                record = record[:id_column] + [str(n + 1)] + record[id_column + 1:]
+            writer.writerow(record)
+    return rows
+
+
+def count_files(directory):
+    """Files under `directory`, leaving out the dataset and the stage logs."""
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if root != directory or d not in ("input", "logs")]
+        total += len(files)
+    return total
+
+
+def run_stage(command, workdir, env, log_path):
+    """Runs one stage to completion; returns (seconds, peak RSS in MB, exit status)."""
+    with open(log_path, "w", encoding="utf-8") as log:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the stage's own resource usage, including the processes it waited for.
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started
+    # Reaped by wait4 already; tell Popen so it does not wait again.
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return elapsed, usage.ru_maxrss / 1024, process.returncode
+
+
+def stage_commands(args, llm_name):
+    python = sys.executable
+    migrate = [python, os.path.join(ROOT, "run_migrations.py"), os.path.join("input", "python", DATASET_NAME),
+               llm_name, "--model", args.model, "--jobs", str(args.jobs), "--no-trace"]
+    if args.use_async:
+        migrate.append("--async")
+    if args.subprocess:
+        migrate.append("--subprocess")
+    if args.stream:
+        migrate.append("--stream")
+    return {
+        "migrate": migrate,
+        "parse": [python, os.path.join(ROOT, "parser.py"), "output", "--output", "parsed", "--jobs", str(args.jobs)],
+        "score": [python, os.path.join(ROOT, "get_codebleu_metric.py"), "--datasets", DATASET_NAME,
+                  "--csv-dir", os.path.join("input", "python"), "--store", "scores.sqlite", "--jobs", str(args.jobs)],
+    }
+
+
+def requests_made(server):
+    return sum(server.counts.get(name, 0) for name in REQUEST_COUNTERS)
+
+
+def format_row(result):
+    rate = "-" if result["requests"] == 0 else f"{result['requests_per_second']:.1f}"
+    return (f"{result['stage']:<8} {result['seconds']:8.2f}s  {result['requests']:>6}  {rate:>8}  "
+            f"{result['peak_rss_mb']:8.1f}  {result['files_written']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the migration pipeline against a fake LLM server")
+    parser.add_argument("--csv", default=os.path.join(ROOT, DEFAULT_CSV),
+                        help=f"Dataset replicated into the benchmark dataset (default: {DEFAULT_CSV})")
+    parser.add_argument("--rows", type=int, default=200, help="Rows of the synthesized dataset (default: 200)")
+    parser.add_argument("--model", choices=("ollama", "gpt"), default="ollama", help="Client backend (default: ollama)")
+    parser.add_argument("--llm-name", default=None, help="Model version requested (default: bench or bench-gpt)")
+    parser.add_argument("--jobs", type=int, default=4, help="Concurrency of every stage (default: 4)")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Use run_migrations.py --async")
+    parser.add_argument("--subprocess", action="store_true", help="Use the legacy one-main.py-per-row runner")
+    parser.add_argument("--stream", action="store_true", help="Stream completions")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server seconds before each completion")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Server seconds between streamed tokens")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="Stages to run, in order")
+    parser.add_argument("--workdir", default=None, help="Scratch directory, kept afterwards (default: a temporary one)")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.subprocess and args.model != "ollama":
+        parser.error("--subprocess only runs Ollama models.")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(workdir, exist_ok=True)
+    llm_name = args.llm_name or ("bench-gpt" if args.model == "gpt" else "bench")
+    rows = synthesize_dataset(args.csv, os.path.join(workdir, "input", "python", DATASET_NAME), args.rows)
+    os.makedirs(os.path.join(workdir, "logs"), exist_ok=True)
+
+    results = []
+    with FakeLLMServer(latency=args.latency, token_latency=args.token_latency) as server:
+        env = {
+            **os.environ,
+            "OLLAMA_HOST": server.url,
+            "OPENAI_BASE_URL": f"{server.url}/v1",
+            "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+            "PYTHONPATH": ROOT,
+        }
+        print(f"Pipeline benchmark: {rows} rows x {TEMPLATE_COUNT} templates, model {args.model}/{llm_name}, "
+              f"{args.jobs} job(s), {args.latency}s latency, in '{workdir}'\n")
+        print(f"{'stage':<8} {'time':>9}  {'reqs':>6}  {'reqs/s':>8}  {'RSS MB':>8}  {'files':>6}")
+
+        commands = stage_commands(args, llm_name)
+        for stage in args.stages:
+            files_before, requests_before = count_files(workdir), requests_made(server)
+            log_path = os.path.join(workdir, "logs", f"{stage}.log")
+            seconds, peak_rss_mb, status = run_stage(commands[stage], workdir, env, log_path)
+            requests = requests_made(server) - requests_before
+            result = {
+                "stage": stage,
+                "seconds": seconds,
+                "requests": requests,
+                "requests_per_second": requests / seconds if seconds else None,
+                "peak_rss_mb": peak_rss_mb,
+                "files_written": count_files(workdir) - files_before,
+                "exit_status": status,
+            }
+            results.append(result)
+            print(format_row(result))
+            if status != 0:
+                print(f"  {stage} exited with status {status}; see '{log_path}'")
+                break
+
+    total = sum(result["seconds"] for result in results)
+    migrate = next((result for result in results if result["stage"] == "migrate"), None)
+    print(f"\nTotal: {total:.2f}s")
+    per_request = args.latency
+    if args.stream:
+        per_request += args.token_latency * len(split_tokens(server.completion))
+    if migrate and migrate["requests"] and per_request:
+        # What the stage would take if the pipeline itself cost nothing.
+        jobs = 1 if args.subprocess else args.jobs
+        floor = -(-migrate["requests"] // jobs) * per_request
+        overhead = (migrate["seconds"] - floor) / migrate["requests"] * 1000
+        print(f"Migrate: {floor:.2f}s of that is server latency at {jobs} job(s); "
+              f"{overhead:.1f}ms of pipeline overhead per request")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rows": rows, "options": vars(args), "stages": results}, f, indent=2)
+    if args.workdir is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if any(result["exit_status"] != 0 for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
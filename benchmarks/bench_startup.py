@@ -0,0 +1,86 @@
+"""
+Measures the import cost of the command-line entry points with
+`python -X importtime` and checks it against benchmarks/startup_budget.json.
+Each module is imported in a fresh interpreter; the median of the cumulative
+import time over --runs runs is compared with its budget (milliseconds).
+Exits with status 1 when a module is over budget.
+
+usage: python benchmarks/bench_startup.py [--runs 5] [--top 5] [--budget benchmarks/startup_budget.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = os.path.join(ROOT, "benchmarks", "startup_budget.json")
+
+
+def import_times(module=None):
+    """{imported module: (self us, cumulative us)} for one fresh import of `module` (None: bare interpreter)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}" if module else "pass"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def measure(module, runs, preloaded=()):
+    """
+    Median cumulative import time of `module` in ms, and the heaviest
+    top-level imports of the last run, leaving out `preloaded` modules.
+    """
+    totals = []
+    for _ in range(runs):
+        times = import_times(module)
+        totals.append(times[module][1] / 1000)
+    heaviest = sorted(
+        (
+            (name, cumulative / 1000) for name, (_, cumulative) in times.items()
+            if name != module and "." not in name and name not in preloaded
+        ),
+        key=lambda item: item[1], reverse=True,
+    )
+    return statistics.median(totals), heaviest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import time of the entry points against a budget")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="JSON file of {module: milliseconds}")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (default: 5)")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest top-level imports shown per module")
+    args = parser.parse_args()
+
+    with open(args.budget, "r", encoding="utf-8") as f:
+        budget = json.load(f)
+
+    # Modules every interpreter imports at startup (site, encodings, ...) are not the entry points' doing.
+    preloaded = set(import_times())
+    over = []
+    for module, limit in budget.items():
+        median, heaviest = measure(module, args.runs, preloaded)
+        status = "ok" if median <= limit else "OVER BUDGET"
+        print(f"{module:<24} {median:8.1f} ms  (budget {limit} ms)  {status}")
+        for name, cumulative in heaviest[:args.top]:
+            print(f"    {name:<28} {cumulative:8.1f} ms")
+        if median > limit:
+            over.append(module)
+
+    if over:
+        print(f"\n{len(over)} module(s) over budget: {', '.join(over)}")
+        sys.exit(1)
+    print("\nAll entry points within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,472 @@
+"""
+Local stand-in for an Ollama server, used to exercise the clients and the
+batch runners without real inference. It also speaks the OpenAI chat
+completions API (plain and streamed) and implements the files and batches
+endpoints used by run_migrations.py --batch.
+
+usage: python benchmarks/fake_llm_server.py --port 11435 --latency 0.5
+       OLLAMA_HOST=http://127.0.0.1:11435 python run_migrations.py ... --async
+       OPENAI_BASE_URL=http://127.0.0.1:11435/v1 OPENAI_API_KEY=x \
+           python run_migrations.py ... --model gpt
+       OPENAI_BASE_URL=http://127.0.0.1:11435/v1 OPENAI_API_KEY=x \
+           python run_migrations.py ... --model gpt --batch --poll-interval 1
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_COMPLETION = "```python\nprint('migrated')\n```"
+
+
+def split_tokens(text):
+    """Rough token split used to stream the canned completion."""
+    return re.findall(r"\s*\S+|\s+", text)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def read_json(self):
+        body = self.read_body()
+        return json.loads(body) if body else {}
+
+    def read_multipart(self):
+        """Fields of a multipart/form-data body as {name: (filename, bytes)}."""
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=default_policy).parsebytes(header + self.read_body())
+        return {
+            part.get_param("name", header="content-disposition"): (part.get_filename(), part.get_payload(decode=True))
+            for part in message.iter_parts()
+        }
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/":
+            body = b"Ollama is running"
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/api/tags":
+            self.server.record("tags")
+            self.send_json({"models": [{"name": m, "model": m} for m in sorted(self.server.models)]})
+        elif self.path.startswith("/v1/batches/"):
+            batch = self.server.batch_status(self.path.rsplit("/", 1)[-1])
+            self.send_json(batch if batch else {"error": {"message": "batch not found"}}, status=200 if batch else 404)
+        elif self.path.startswith("/v1/files/") and self.path.endswith("/content"):
+            stored = self.server.files.get(self.path.split("/")[3])
+            if stored is None:
+                self.send_json({"error": {"message": "file not found"}}, status=404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(stored["data"])))
+            self.end_headers()
+            self.wfile.write(stored["data"])
+        elif self.path == "/api/ps":
+            self.server.record("ps")
+            with self.server._lock:
+                loaded = sorted(self.server.loaded_models)
+            self.send_json({"models": [{"name": m, "model": m} for m in loaded]})
+        else:
+            self.send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def do_POST(self):
+        if self.path == "/v1/files":
+            fields = self.read_multipart()
+            filename, data = fields["file"]
+            purpose = fields.get("purpose", (None, b""))[1].decode("utf-8")
+            self.send_json(self.server.store_file(filename, data, purpose))
+            return
+        payload = self.read_json()
+        if self.path == "/v1/batches":
+            self.send_json(self.server.create_batch(payload))
+        elif self.path == "/v1/chat/completions":
+            with self.server.in_flight():
+                self.handle_openai_chat(payload)
+        elif self.path == "/api/chat":
+            with self.server.in_flight():
+                self.handle_ollama_chat(payload)
+        elif self.path == "/api/generate" and not payload.get("prompt"):
+            # Empty generate requests only load or (with keep_alive=0) unload a model.
+            if payload.get("keep_alive") == 0:
+                self.server.unload_model(payload.get("model"))
+            else:
+                self.server.load_model(payload.get("model"))
+            self.send_json({"model": payload.get("model"), "response": "", "done": True,
+                            "done_reason": "unload" if payload.get("keep_alive") == 0 else "load"})
+        elif self.path == "/api/pull":
+            self.server.record("pull")
+            model = payload.get("model") or ""
+            self.server.models.add(model if ":" in model else f"{model}:latest")
+            self.send_json({"status": "success"})
+        elif self.path == "/api/show":
+            model = payload.get("model") or ""
+            if model in self.server.models or f"{model}:latest" in self.server.models:
+                model_info = {"general.architecture": "llama", "llama.context_length": self.server.context_length}
+                self.send_json({"modelfile": "", "details": {}, "model_info": model_info})
+            else:
+                self.send_json({"error": "model not found"}, status=404)
+        else:
+            self.send_json({"error": f"unknown path {self.path}"}, status=404)
+
+    def start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def stream_tokens(self):
+        """Yields the completion token by token, honouring the configured delays."""
+        for token in split_tokens(self.server.completion):
+            time.sleep(self.server.token_latency)
+            yield token
+
+    def ollama_usage(self, payload, started, load_duration):
+        """The token counts and nanosecond durations Ollama adds to its final message."""
+        elapsed = time.perf_counter() - started
+        prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+        return {
+            "total_duration": int(elapsed * 1e9),
+            "load_duration": int(load_duration * 1e9),
+            "prompt_eval_count": len(split_tokens(prompt)),
+            "prompt_eval_duration": 0,
+            "eval_count": len(split_tokens(self.server.completion)),
+            "eval_duration": int(max(0.0, elapsed - load_duration) * 1e9),
+        }
+
+    def handle_ollama_chat(self, payload):
+        self.server.record("chat")
+        self.server.last_options = payload.get("options")
+        started = time.perf_counter()
+        load_duration = self.server.load_model(payload.get("model"))
+        time.sleep(self.server.latency)
+        if payload.get("stream"):
+            self.start_chunked("application/x-ndjson")
+            try:
+                for token in self.stream_tokens():
+                    self.write_chunk(json.dumps({
+                        "model": payload.get("model"),
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "message": {"role": "assistant", "content": token},
+                        "done": False,
+                    }).encode("utf-8") + b"\n")
+                self.write_chunk(json.dumps({
+                    "model": payload.get("model"),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "done_reason": "stop",
+                    **self.ollama_usage(payload, started, load_duration),
+                }).encode("utf-8") + b"\n")
+                self.end_chunked()
+            except ConnectionError:
+                # The client cancelled the generation.
+                self.server.record("cancelled")
+                self.close_connection = True
+            return
+        self.send_json({
+            "model": payload.get("model"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": self.server.completion},
+            "done": True,
+            "done_reason": "stop",
+            **self.ollama_usage(payload, started, load_duration),
+        })
+
+
+    def handle_openai_chat(self, payload):
+        self.server.record("openai_chat")
+        time.sleep(self.server.latency)
+        model, messages = payload.get("model"), payload.get("messages", [])
+        completion = self.server.openai_completion(model, messages)
+        if not payload.get("stream"):
+            self.send_json(completion)
+            return
+
+        def event(delta, finish_reason=None, usage=None):
+            chunk = {
+                "id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                "model": model, "choices": [] if usage else [
+                    {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                ],
+            }
+            if usage:
+                chunk["usage"] = usage
+            return f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+
+        self.start_chunked("text/event-stream")
+        try:
+            self.write_chunk(event({"role": "assistant", "content": ""}))
+            for token in self.stream_tokens():
+                self.write_chunk(event({"content": token}))
+            self.write_chunk(event({}, finish_reason="stop"))
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                self.write_chunk(event({}, usage=completion["usage"]))
+            self.write_chunk(b"data: [DONE]\n\n")
+            self.end_chunked()
+        except ConnectionError:
+            self.server.record("cancelled")
+            self.close_connection = True
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering every chat request with a canned
+    completion after `latency` seconds. Streamed requests receive one
+    token every `token_latency` seconds. The first chat request for each
+    model also waits `load_latency` seconds, reported as its load_duration;
+    with `max_loaded_models`, loading one more model evicts the oldest.
+    OpenAI batches complete `batch_latency` seconds after they are created;
+    requests whose custom_id is in `failing_requests` fail the first time
+    they are batched and go to the batch's error file.
+    /api/show reports `context_length` for every model, and the options of
+    the last chat request are kept in `last_options`. `max_active_requests`
+    is the highest number of chat requests served at the same time.
+    Can be used as a context manager, in which case it serves from a
+    background thread.
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, completion=DEFAULT_COMPLETION,
+                 models=(), verbose=False, token_latency=0.0, load_latency=0.0, max_loaded_models=None,
+                 batch_latency=0.0, context_length=8192, failing_requests=()):
+        super().__init__((host, port), FakeLLMHandler)
+        self.latency = latency
+        self.load_latency = load_latency
+        self.max_loaded_models = max_loaded_models
+        # OpenAI files and batches; a batch completes `batch_latency` seconds after it was created
+        self.batch_latency = batch_latency
+        self.files = {}
+        self.batches = {}
+        self.failing_requests = set(failing_requests)
+        # Insertion-ordered, so the oldest model is evicted first
+        self.loaded_models = {}
+        self.context_length = context_length
+        self.last_options = None
+        self.token_latency = token_latency
+        self.completion = completion
+        self.models = set(models)
+        self.verbose = verbose
+        self.counts = {}
+        # Chat requests being answered right now, and the most there ever were at once
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up before the canned reply is written.
+        if self.verbose:
+            super().handle_error(request, client_address)
+
+    def openai_completion(self, model, messages):
+        """Chat completion object in the shape the OpenAI API returns."""
+        prompt = " ".join(m.get("content", "") for m in messages)
+        prompt_tokens = len(split_tokens(prompt))
+        completion_tokens = len(split_tokens(self.completion))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.completion},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def store_file(self, filename, data, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            self.files[file_id] = {"filename": filename, "purpose": purpose, "data": data}
+        self.record("file_upload")
+        return {
+            "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+            "filename": filename, "purpose": purpose, "status": "processed",
+        }
+
+    def create_batch(self, payload):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        lines = self.files[payload["input_file_id"]]["data"].decode("utf-8").splitlines()
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": payload["endpoint"],
+            "input_file_id": payload["input_file_id"], "completion_window": payload["completion_window"],
+            "created_at": int(time.time()), "status": "validating", "metadata": payload.get("metadata"),
+            "output_file_id": None, "error_file_id": None,
+            "request_counts": {"total": sum(1 for line in lines if line.strip()), "completed": 0, "failed": 0},
+            "_started": time.perf_counter(),
+        }
+        with self._lock:
+            self.batches[batch_id] = batch
+        self.record("batch_create")
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def batch_status(self, batch_id):
+        """Moves a batch along validating -> in_progress -> completed as `batch_latency` elapses."""
+        self.record("batch_retrieve")
+        with self._lock:
+            batch = self.batches.get(batch_id)
+            if batch is None:
+                return None
+            if batch["status"] != "completed":
+                if time.perf_counter() - batch["_started"] >= self.batch_latency:
+                    self._complete_batch(batch)
+                else:
+                    batch["status"] = "in_progress"
+            return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def _complete_batch(self, batch):
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request["body"]
+            if request["custom_id"] in self.failing_requests:
+                self.failing_requests.discard(request["custom_id"])
+                status_code = 500
+                response_body = {"error": {"message": "The server had an error processing the request.",
+                                           "type": "server_error"}}
+            else:
+                status_code = 200
+                response_body = self.openai_completion(body.get("model"), body.get("messages", []))
+            (output if status_code == 200 else errors).append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": status_code, "request_id": uuid.uuid4().hex, "body": response_body},
+                "error": None,
+            }))
+        output_id = self._store_batch_file("batch_output.jsonl", output) if output else None
+        error_id = self._store_batch_file("batch_errors.jsonl", errors) if errors else None
+        batch.update(status="completed", output_file_id=output_id, error_file_id=error_id,
+                     completed_at=int(time.time()))
+        batch["request_counts"].update(completed=len(output), failed=len(errors))
+
+    def _store_batch_file(self, filename, lines):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[file_id] = {
+            "filename": filename, "purpose": "batch_output",
+            "data": ("\n".join(lines) + "\n").encode("utf-8"),
+        }
+        return file_id
+
+    def load_model(self, model):
+        """Simulates loading `model` into memory; returns the time it took."""
+        with self._lock:
+            cold = model not in self.loaded_models
+            self.loaded_models[model] = True
+            if self.max_loaded_models and len(self.loaded_models) > self.max_loaded_models:
+                # Evict the least recently loaded model, as a GPU without room for both would.
+                del self.loaded_models[next(m for m in self.loaded_models if m != model)]
+        if not cold:
+            return 0.0
+        self.record("load")
+        time.sleep(self.load_latency)
+        return self.load_latency
+
+    def unload_model(self, model):
+        with self._lock:
+            if model in self.loaded_models:
+                self.counts["unload"] = self.counts.get("unload", 0) + 1
+            self.loaded_models.pop(model, None)
+
+    @contextmanager
+    def in_flight(self):
+        with self._lock:
+            self.active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.active_requests -= 1
+
+    def record(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve canned LLM completions over the Ollama and OpenAI HTTP APIs (chat and batches)."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before each completion.")
+    parser.add_argument("--token-latency", type=float, default=0.0,
+                        help="Seconds between tokens of a streamed completion.")
+    parser.add_argument("--load-latency", type=float, default=0.0,
+                        help="Extra seconds for the first request of each model, reported as a cold load.")
+    parser.add_argument("--batch-latency", type=float, default=0.0,
+                        help="Seconds before an OpenAI batch completes.")
+    parser.add_argument("--max-loaded-models", type=int, default=None,
+                        help="Models that fit in memory at once; loading another evicts the oldest.")
+    parser.add_argument("--context-length", type=int, default=8192,
+                        help="Context length /api/show reports for every model.")
+    parser.add_argument("--completion", default=DEFAULT_COMPLETION, help="Text returned for every chat request.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.host, args.port, args.latency, args.completion, verbose=args.verbose,
+                           token_latency=args.token_latency, load_latency=args.load_latency,
+                           max_loaded_models=args.max_loaded_models, batch_latency=args.batch_latency,
+                           context_length=args.context_length)
+    print(f"Fake LLM server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
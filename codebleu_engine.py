@@ -0,0 +1,66 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+# Kept free of logging/configuration side effects: with the 'spawn' start
+# method every worker process re-imports this module.
+
+_lang = "python"
+_initialized = False
+
+
+def _init_worker(lang):
+    """Loads codebleu once per worker and reuses its tree-sitter language."""
+    global _lang, _initialized
+    _lang = lang
+    _initialized = True
+    import codebleu.codebleu as codebleu_module
+
+    if not hasattr(codebleu_module.get_tree_sitter_language, "cache_info"):
+        codebleu_module.get_tree_sitter_language = lru_cache(maxsize=None)(
+            codebleu_module.get_tree_sitter_language
+        )
+
+
+def score_pair(pair):
+    """CodeBLEU of one (prediction, reference) pair, scored on its own."""
+    from codebleu import calc_codebleu
+
+    prediction, reference = pair
+    result = calc_codebleu(predictions=[prediction], references=[[reference]], lang=_lang)
+    return result["codebleu"]
+
+
+def score_one(prediction, reference, lang="python"):
+    """
+    CodeBLEU of a single pair in the current process, for callers that
+    score results one at a time (see postprocess.PostProcessor). codebleu
+    is set up on the first call only. Not thread-safe; callers serialize.
+    """
+    if not _initialized or _lang != lang:
+        _init_worker(lang)
+    return score_pair((prediction, reference))
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def score_pairs(pairs, jobs=1, lang="python"):
+    """
+    Scores a list of (prediction, reference) pairs and returns the scores in
+    the same order. Every pair is still scored with its own calc_codebleu
+    call, so results are identical to scoring them one by one; with
+    jobs > 1 the pairs are sent in chunks to a pool of worker processes.
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    if jobs <= 1 or len(pairs) == 1:
+        _init_worker(lang)
+        return [score_pair(pair) for pair in pairs]
+
+    jobs = min(jobs, len(pairs))
+    chunksize = max(1, len(pairs) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(lang,)) as executor:
+        return list(executor.map(score_pair, pairs, chunksize=chunksize))
@@ -0,0 +1,205 @@
+import csv
+import hashlib
+import os
+import pickle
+import sys
+import threading
+
+# Every script reads the migration datasets through here: the CSV is parsed
+# once, stored as a pickle next to the other caches and reused for as long
+# as the CSV's size and mtime do not change.
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "datasets")
+CACHE_VERSION = 1
+
+# Raw dataset column -> name used by the scripts
+COLUMN_ALIASES = {
+    "before": "code_before",
+    "after": "code_after",
+    "rmv_lib": "legacy_lib",
+    "add_lib": "target_lib",
+    "repo": "repo_name",
+}
+
+# Columns with one lookup index each; see Dataset.index
+INDEXED_COLUMNS = ("id", "repo_name", "commit", "lib_pair")
+
+
+def normalize_columns(fieldnames):
+    return [COLUMN_ALIASES.get(name, name) for name in fieldnames]
+
+
+def parse_csv(csv_path):
+    """
+    Parses the CSV into {column: list of str} under the normalised schema.
+    Rows without an 'id' get their 1-based row number as id.
+    """
+    csv.field_size_limit(sys.maxsize)
+    with open(csv_path, mode="r", newline="", encoding="utf-8") as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is None:
+            return {"id": []}
+        names = normalize_columns(header)
+        columns = {name: [] for name in names}
+        lists = [columns[name] for name in names]
+        width = len(names)
+        for record in reader:
+            if len(record) < width:
+                record += [""] * (width - len(record))
+            for values, value in zip(lists, record):
+                values.append(value)
+    if "id" not in columns:
+        length = len(lists[0]) if lists else 0
+        columns["id"] = [str(n) for n in range(1, length + 1)]
+    return columns
+
+
+class Dataset:
+    """
+    Column store of one migration dataset. Columns are kept pickled until
+    first used, so reading only 'id' and 'code_after' never unpickles the
+    'before' code. Rows are addressed by 0-based position (dataset[i]) or
+    looked up through the indexes on id, repo_name, commit and lib_pair.
+    """
+
+    def __init__(self, source, length, blobs):
+        self.source = source
+        self.columns = list(blobs)
+        self._length = length
+        self._blobs = blobs
+        self._loaded = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._length
+
+    def __contains__(self, column):
+        return column in self._blobs
+
+    def column(self, name):
+        """Values of one column, unpickled on first access."""
+        values = self._loaded.get(name)
+        if values is None:
+            if name == "lib_pair":
+                values = list(zip(self.column("legacy_lib"), self.column("target_lib")))
+            elif name not in self._blobs:
+                raise KeyError(f"Dataset '{self.source}' has no column '{name}'")
+            else:
+                values = pickle.loads(self._blobs[name])
+            with self._lock:
+                values = self._loaded.setdefault(name, values)
+        return values
+
+    def __getitem__(self, position):
+        if not 0 <= position < self._length:
+            raise IndexError(f"Dataset '{self.source}' does not contain row {position}")
+        return {name: self.column(name)[position] for name in self.columns}
+
+    def __iter__(self):
+        columns = [self.column(name) for name in self.columns]
+        for values in zip(*columns):
+            yield dict(zip(self.columns, values))
+
+    def rows(self, positions=None):
+        if positions is None:
+            return list(self)
+        return [self[position] for position in positions]
+
+    def index(self, column):
+        """{value: [positions]} for one of INDEXED_COLUMNS, built on first use."""
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for position, value in enumerate(self.column(column)):
+                index.setdefault(value, []).append(position)
+            with self._lock:
+                index = self._indexes.setdefault(column, index)
+        return index
+
+    def get(self, migration_id):
+        """Row with the given id, or None."""
+        positions = self.index("id").get(str(migration_id))
+        return self[positions[0]] if positions else None
+
+    def where(self, column, value):
+        return self.rows(self.index(column).get(value, []))
+
+    def to_frame(self, columns=None):
+        import pandas as pd
+
+        names = self.columns if columns is None else columns
+        return pd.DataFrame({name: self.column(name) for name in names})
+
+
+def cache_path_for(csv_path, cache_dir=DEFAULT_CACHE_DIR):
+    absolute = os.path.abspath(csv_path)
+    digest = hashlib.sha1(absolute.encode("utf-8")).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(absolute))[0]
+    return os.path.join(cache_dir, f"{stem}-{digest}.pickle")
+
+
+def _read_cache(path, stat):
+    try:
+        with open(path, "rb") as file:
+            cached = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if (
+        cached.get("version") != CACHE_VERSION
+        or cached.get("mtime_ns") != stat.st_mtime_ns
+        or cached.get("size") != stat.st_size
+    ):
+        return None
+    return cached
+
+
+def _write_cache(path, cached):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as file:
+            pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write dataset cache '{path}': {e}")
+
+
+_loaded_datasets = {}
+_loaded_lock = threading.Lock()
+
+
+def load_dataset(csv_path, cache_dir=DEFAULT_CACHE_DIR, use_cache=True):
+    """
+    Returns the Dataset for `csv_path`. Within a process the same object is
+    returned until the CSV changes; across processes the pickle in
+    `cache_dir` spares the CSV parse.
+    """
+    stat = os.stat(csv_path)
+    key = (os.path.abspath(csv_path), stat.st_mtime_ns, stat.st_size)
+    with _loaded_lock:
+        dataset = _loaded_datasets.get(key)
+    if dataset is not None:
+        return dataset
+
+    path = cache_path_for(csv_path, cache_dir)
+    cached = _read_cache(path, stat) if use_cache else None
+    if cached is None:
+        columns = parse_csv(csv_path)
+        cached = {
+            "version": CACHE_VERSION,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "length": len(columns["id"]),
+            "blobs": {
+                name: pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+                for name, values in columns.items()
+            },
+        }
+        if use_cache:
+            _write_cache(path, cached)
+
+    dataset = Dataset(csv_path, cached["length"], cached["blobs"])
+    with _loaded_lock:
+        return _loaded_datasets.setdefault(key, dataset)
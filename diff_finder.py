@@ -1,43 +1,284 @@
 import argparse
-import csv
 import difflib
-from typing import List, Dict, Optional
+import os
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
+from dataset import load_dataset
+from files import split_attempt
 
-def calculate_similarity(str1: str, str2: str) -> float:
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # optional C-accelerated similarity
+    fuzz = None
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def calculate_similarity(str1: str, str2: str, cutoff: Optional[float] = None) -> float:
+    """difflib ratio of two strings as a percentage.
+
+    With a cutoff, pairs whose upper bound cannot reach it are reported as 0
+    without running the full comparison (as difflib.get_close_matches does).
+    """
+    if str1 == str2:
+        return 100.0
+    if not str1 or not str2:
+        return 0.0
+    matcher = difflib.SequenceMatcher(None, str1, str2)
+    if cutoff is not None and (
+        matcher.real_quick_ratio() * 100 < cutoff or matcher.quick_ratio() * 100 < cutoff
+    ):
+        return 0.0
+    return matcher.ratio() * 100
+
+
+def rapidfuzz_similarity(str1: str, str2: str, cutoff: Optional[float] = None) -> float:
+    """C-accelerated Indel similarity. Close to, but not always equal to, the difflib ratio."""
+    if fuzz is None:
+        raise ImportError("The 'rapidfuzz' similarity needs the rapidfuzz package (pip install rapidfuzz)")
     if not str1 and not str2:
         return 100.0
-    return difflib.SequenceMatcher(None, str1, str2).ratio() * 100
+    return fuzz.ratio(str1, str2, score_cutoff=cutoff or 0)
 
 
-def text_diff_analysis(old_text: str, new_text: str) -> List[Dict]:
-    """Produce a line-aligned diff with similarity per pair and line indices.
+SIMILARITY_BACKENDS: Dict[str, Callable[..., float]] = {
+    'difflib': calculate_similarity,
+    'rapidfuzz': rapidfuzz_similarity,
+}
 
-    Each result item contains:
-      - old_index (1-based) or None
-      - new_index (1-based) or None
-      - line_old: original line or None
-      - line_new: new line or None
-      - absolute_diff: one of 'equal','modified','removed','added'
-      - similarity: percentage (0-100) for modified/equals, 0 for pure adds/removes
+
+def intern_lines(lines1: Sequence[str], lines2: Sequence[str]) -> Tuple[List[int], List[int]]:
+    """Replace each distinct line by a small int so line comparisons are int comparisons."""
+    ids: Dict[str, int] = {}
+    interned1 = [ids.setdefault(line, len(ids)) for line in lines1]
+    interned2 = [ids.setdefault(line, len(ids)) for line in lines2]
+    return interned1, interned2
+
+
+def difflib_opcodes(a: Sequence, b: Sequence) -> List[Opcode]:
+    return difflib.SequenceMatcher(None, a, b).get_opcodes()
+
+
+def interned_opcodes(a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+    """Same opcodes as difflib_opcodes, computed over interned lines."""
+    return difflib_opcodes(*intern_lines(a, b))
+
+
+def _unique_anchors(a: Sequence[int], b: Sequence[int], alo: int, ahi: int, blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """Longest increasing run of lines that occur exactly once on both sides."""
+    counts: Dict[int, List[int]] = {}
+    for i in range(alo, ahi):
+        entry = counts.setdefault(a[i], [0, 0, i, -1])
+        entry[0] += 1
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] += 1
+            entry[3] = j
+    candidates = sorted((i, j) for count_a, count_b, i, j in counts.values() if count_a == 1 and count_b == 1)
+
+    # patience sorting: longest increasing subsequence of the b positions
+    tails: List[int] = []
+    tail_index: List[int] = []
+    previous: List[int] = []
+    for k, (_, j) in enumerate(candidates):
+        pos = bisect_left(tails, j)
+        previous.append(tail_index[pos - 1] if pos else -1)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+    anchors = []
+    k = tail_index[-1] if tail_index else -1
+    while k != -1:
+        anchors.append(candidates[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def _patience_matches(a, b, alo, ahi, blo, bhi, matches):
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        matches.append((alo, blo))
+        alo += 1
+        blo += 1
+    suffix = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+        suffix.append((ahi, bhi))
+
+    if alo < ahi and blo < bhi:
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        if anchors:
+            for i, j in anchors:
+                _patience_matches(a, b, alo, i, blo, j, matches)
+                matches.append((i, j))
+                alo, blo = i + 1, j + 1
+            _patience_matches(a, b, alo, ahi, blo, bhi, matches)
+        else:
+            # no unique line left to anchor on: fall back to difflib for this region
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                matches.extend((alo + i + k, blo + j + k) for k in range(size))
+
+    matches.extend(reversed(suffix))
+
+
+def patience_opcodes(a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+    """Patience diff over interned lines, returned as difflib-style opcodes."""
+    a, b = intern_lines(a, b)
+    matches: List[Tuple[int, int]] = []
+    _patience_matches(a, b, 0, len(a), 0, len(b), matches)
+    matches.append((len(a), len(b)))  # sentinel
+
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for mi, mj in matches:
+        if i < mi and j < mj:
+            opcodes.append(('replace', i, mi, j, mj))
+        elif i < mi:
+            opcodes.append(('delete', i, mi, j, mj))
+        elif j < mj:
+            opcodes.append(('insert', i, mi, j, mj))
+        if mi < len(a):
+            if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == mi:
+                tag, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(('equal', i1, mi + 1, j1, mj + 1))
+            else:
+                opcodes.append(('equal', mi, mi + 1, mj, mj + 1))
+        i, j = mi + 1, mj + 1
+    return opcodes
+
+
+DIFF_BACKENDS: Dict[str, Callable[[Sequence[str], Sequence[str]], List[Opcode]]] = {
+    'difflib': difflib_opcodes,
+    'interned': interned_opcodes,
+    'patience': patience_opcodes,
+}
+
+
+class _MaxFenwick:
+    """Prefix-maximum Fenwick tree over positions 0..size-1, storing (score, payload)."""
+
+    def __init__(self, size: int):
+        self.tree: List[Tuple[float, int]] = [(0.0, -1)] * (size + 1)
+
+    def update(self, pos: int, item: Tuple[float, int]):
+        pos += 1
+        while pos < len(self.tree):
+            if item[0] > self.tree[pos][0]:
+                self.tree[pos] = item
+            pos += pos & -pos
+
+    def query(self, pos: int) -> Tuple[float, int]:
+        """Best item stored at positions < pos."""
+        best = (0.0, -1)
+        while pos > 0:
+            if self.tree[pos][0] > best[0]:
+                best = self.tree[pos]
+            pos -= pos & -pos
+        return best
+
+
+def align_replace_block(old_lines: Sequence[str], new_lines: Sequence[str],
+                        line_similarity: Callable[..., float] = calculate_similarity,
+                        min_similarity: float = 50.0, window: int = 8
+                        ) -> List[Tuple[Optional[int], Optional[int], float]]:
+    """Pair the lines of a replace block by maximum total similarity.
+
+    Only pairs within `window` lines of the block's diagonal (scaled to the
+    sizes of the two sides) and at least `min_similarity` similar are
+    considered, so at most len(old_lines) * (2 * window + 1) similarities
+    are computed however lopsided the block is; the cutoff also lets the
+    similarity skip hopeless pairs cheaply. The chosen pairs keep both
+    sides in order (a max-weight increasing chain, found with a Fenwick
+    tree). Returns (old offset, new offset, similarity) tuples in
+    output order, with None for lines left unpaired.
     """
-    lines1 = old_text.splitlines() if old_text is not None else []
-    lines2 = new_text.splitlines() if new_text is not None else []
+    n, m = len(old_lines), len(new_lines)
+    candidates: List[Tuple[int, int, float]] = []
+    for i in range(n):
+        diagonal = (i * m + m // 2) // n
+        lo = max(0, diagonal - window)
+        hi = min(m, diagonal + window + 1)
+        for j in range(lo, hi):
+            sim = line_similarity(old_lines[i], new_lines[j], min_similarity)
+            if sim >= min_similarity:
+                candidates.append((i, j, sim))
+
+    # best chain ending at each candidate; rows are finished before they are
+    # published so that a chain never uses two pairs of the same old line
+    fenwick = _MaxFenwick(m)
+    best: List[Tuple[float, int]] = []
+    row_start = 0
+    for k, (i, j, sim) in enumerate(candidates):
+        if i != candidates[row_start][0]:
+            for r in range(row_start, k):
+                fenwick.update(candidates[r][1], (best[r][0], r))
+            row_start = k
+        score, previous = fenwick.query(j)
+        best.append((score + sim, previous))
+
+    chain: List[int] = []
+    if best:
+        k = max(range(len(best)), key=lambda idx: best[idx][0])
+        while k != -1:
+            chain.append(k)
+            k = best[k][1]
+        chain.reverse()
+
+    aligned: List[Tuple[Optional[int], Optional[int], float]] = []
+    oi = nj = 0
+    for k in chain + [None]:
+        i, j, sim = candidates[k] if k is not None else (n, m, 0.0)
+        aligned.extend((o, None, 0.0) for o in range(oi, i))
+        aligned.extend((None, nn, 0.0) for nn in range(nj, j))
+        if k is not None:
+            aligned.append((i, j, sim))
+        oi, nj = i + 1, j + 1
+    return aligned
+
 
-    matcher = difflib.SequenceMatcher(None, lines1, lines2)
-    results: List[Dict] = []
+# compact tag codes, in the order of DIFF_TAGS
+EQUAL, MODIFIED, REMOVED, ADDED = range(4)
+DIFF_TAGS = ('equal', 'modified', 'removed', 'added')
 
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+DiffRecord = Tuple[int, int, int, float]
+
+
+def iter_diff_records(lines1: Sequence[str], lines2: Sequence[str], backend: str = 'interned',
+                      similarity: str = 'difflib', cutoff: Optional[float] = None,
+                      align: str = 'offset', min_similarity: float = 50.0, window: int = 8,
+                      skip_equal: bool = False) -> Iterator[DiffRecord]:
+    """Lazily yield (old_index, new_index, tag code, similarity) tuples.
+
+    Indices are 1-based, with 0 standing for a missing side; tag codes
+    index DIFF_TAGS. With skip_equal, equal runs are skipped without
+    producing a single record.
+    """
+    line_similarity = SIMILARITY_BACKENDS[similarity]
+
+    for tag, i1, i2, j1, j2 in DIFF_BACKENDS[backend](lines1, lines2):
         if tag == 'equal':
+            if skip_equal:
+                continue
             for i, j in zip(range(i1, i2), range(j1, j2)):
-                results.append({
-                    "old_index": i + 1,
-                    "new_index": j + 1,
-                    "line_old": lines1[i],
-                    "line_new": lines2[j],
-                    "absolute_diff": "equal",
-                    "similarity": 100.0,
-                })
+                yield i + 1, j + 1, EQUAL, 100.0
+        elif tag == 'replace' and align == 'best':
+            for oi, nj, sim in align_replace_block(lines1[i1:i2], lines2[j1:j2], line_similarity,
+                                                   min_similarity=min_similarity, window=window):
+                if oi is not None and nj is not None:
+                    yield i1 + oi + 1, j1 + nj + 1, MODIFIED, round(sim, 2)
+                elif oi is not None:
+                    yield i1 + oi + 1, 0, REMOVED, 0.0
+                else:
+                    yield 0, j1 + nj + 1, ADDED, 0.0
         elif tag == 'replace':
             # number of lines might differ between the replaced spans
             max_range = max(i2 - i1, j2 - j1)
@@ -47,37 +288,107 @@ def text_diff_analysis(old_text: str, new_text: str) -> List[Dict]:
                 l1: Optional[str] = lines1[oi] if oi < i2 else None
                 l2: Optional[str] = lines2[nj] if nj < j2 else None
 
-                sim = calculate_similarity(l1 or "", l2 or "")
-                results.append({
-                    "old_index": (oi + 1) if l1 is not None else None,
-                    "new_index": (nj + 1) if l2 is not None else None,
-                    "line_old": l1,
-                    "line_new": l2,
-                    "absolute_diff": "modified",
-                    "similarity": round(sim, 2),
-                })
+                sim = line_similarity(l1 or "", l2 or "", cutoff)
+                yield ((oi + 1) if l1 is not None else 0, (nj + 1) if l2 is not None else 0,
+                       MODIFIED, round(sim, 2))
         elif tag == 'delete':
             for i in range(i1, i2):
-                results.append({
-                    "old_index": i + 1,
-                    "new_index": None,
-                    "line_old": lines1[i],
-                    "line_new": None,
-                    "absolute_diff": "removed",
-                    "similarity": 0.0,
-                })
+                yield i + 1, 0, REMOVED, 0.0
         elif tag == 'insert':
             for j in range(j1, j2):
-                results.append({
-                    "old_index": None,
-                    "new_index": j + 1,
-                    "line_old": None,
-                    "line_new": lines2[j],
-                    "absolute_diff": "added",
-                    "similarity": 0.0,
-                })
+                yield 0, j + 1, ADDED, 0.0
 
-    return results
+
+class DiffResult:
+    """Struct-of-arrays diff: int indices, tag codes and float32 similarities,
+    plus references to the original line lists instead of per-record copies.
+
+    Iterating (or indexing) gives the same dicts text_diff_analysis returns.
+    When built with skip_equal, equal lines are only counted (equal_count).
+    """
+    __slots__ = ('lines_old', 'lines_new', 'old_index', 'new_index', 'tags', 'similarity',
+                 'equal_count', 'skip_equal')
+
+    def __init__(self, lines_old: Sequence[str], lines_new: Sequence[str],
+                 records: Iterable[DiffRecord], skip_equal: bool = False):
+        self.lines_old = lines_old
+        self.lines_new = lines_new
+        self.old_index = array('i')
+        self.new_index = array('i')
+        self.tags = array('b')
+        self.similarity = array('f')
+        self.skip_equal = skip_equal
+        old_seen = 0
+        for oi, nj, tag, sim in records:
+            self.old_index.append(oi)
+            self.new_index.append(nj)
+            self.tags.append(tag)
+            self.similarity.append(sim)
+            old_seen += oi != 0
+        # every old line is reported exactly once, so skipped equal lines are the rest
+        self.equal_count = len(lines_old) - old_seen if skip_equal else self.tags.count(EQUAL)
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def __getitem__(self, k: int) -> Dict:
+        oi, nj = self.old_index[k], self.new_index[k]
+        return {
+            "old_index": oi or None,
+            "new_index": nj or None,
+            "line_old": self.lines_old[oi - 1] if oi else None,
+            "line_new": self.lines_new[nj - 1] if nj else None,
+            "absolute_diff": DIFF_TAGS[self.tags[k]],
+            # similarities are stored rounded to 2 decimals; undo the float32 rounding
+            "similarity": round(float(self.similarity[k]), 2),
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        return (self[k] for k in range(len(self)))
+
+    def counts(self) -> Dict[str, int]:
+        counts = {tag: self.tags.count(code) for code, tag in enumerate(DIFF_TAGS)}
+        counts['equal'] = self.equal_count
+        return counts
+
+    def to_dicts(self) -> List[Dict]:
+        return list(self)
+
+
+def text_diff_compact(old_text: str, new_text: str, skip_equal: bool = False, **options) -> DiffResult:
+    """Compact counterpart of text_diff_analysis (same options); see DiffResult."""
+    lines1 = old_text.splitlines() if old_text is not None else []
+    lines2 = new_text.splitlines() if new_text is not None else []
+    return DiffResult(lines1, lines2, iter_diff_records(lines1, lines2, skip_equal=skip_equal, **options),
+                      skip_equal=skip_equal)
+
+
+def text_diff_analysis(old_text: str, new_text: str, backend: str = 'interned',
+                       similarity: str = 'difflib', cutoff: Optional[float] = None,
+                       align: str = 'offset', min_similarity: float = 50.0, window: int = 8) -> List[Dict]:
+    """Produce a line-aligned diff with similarity per pair and line indices.
+
+    `backend` picks the line diff (see DIFF_BACKENDS; 'difflib' and
+    'interned' give identical results, 'patience' aligns on unique lines),
+    `similarity` the per-line similarity (see SIMILARITY_BACKENDS) and
+    `cutoff` lets the similarity skip pairs that cannot reach it.
+
+    `align` decides how lines inside a replace block are paired: 'offset'
+    pairs them by position, 'best' by maximum similarity (see
+    align_replace_block); lines it leaves unpaired are reported as
+    'removed'/'added'.
+
+    This is the list-of-dicts view of text_diff_compact, which is cheaper
+    for large files and batch use. Each result item contains:
+      - old_index (1-based) or None
+      - new_index (1-based) or None
+      - line_old: original line or None
+      - line_new: new line or None
+      - absolute_diff: one of 'equal','modified','removed','added'
+      - similarity: percentage (0-100) for modified/equals, 0 for pure adds/removes
+    """
+    return text_diff_compact(old_text, new_text, backend=backend, similarity=similarity, cutoff=cutoff,
+                             align=align, min_similarity=min_similarity, window=window).to_dicts()
 
 
 def print_lines_mode(diff_results: List[Dict]):
@@ -119,12 +430,161 @@ def print_similarity_mode(old_text: str, new_text: str, diff_results: List[Dict]
 
 def _read_csv_row(csv_path: str, row_number: int = 1) -> Dict[str, str]:
     # row_number is 1-based (first data row is 1)
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for idx, row in enumerate(reader, start=1):
-            if idx == row_number:
-                return row
-    raise IndexError(f"CSV does not contain row {row_number}")
+    dataset = load_dataset(csv_path)
+    if not 1 <= row_number <= len(dataset):
+        raise IndexError(f"CSV does not contain row {row_number}")
+    return dataset[row_number - 1]
+
+
+# --- Dataset-wide batch mode ---
+
+ROW_COLUMNS = ['row', 'repo', 'commit', 'rmv_lib', 'add_lib', 'type', 'old_lines', 'new_lines',
+               'equal', 'modified', 'removed', 'added', 'changed_ratio', 'mean_modified_similarity']
+LINE_COLUMNS = ['row', 'old_index', 'new_index', 'absolute_diff', 'similarity']
+SIMILARITY_BINS = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100]
+
+
+def _index_outputs(outputs_dir: str) -> Dict[str, str]:
+    """Map 'python_<old>_<new><id>' names under an output/ folder to their file, skipping raw/ copies."""
+    index: Dict[str, str] = {}
+    for root, dirs, files in os.walk(outputs_dir):
+        dirs[:] = [d for d in dirs if d != 'raw' and not d.startswith('.')]
+        for filename in sorted(files):
+            if filename.startswith('.'):
+                continue
+            stem = filename[:-4] if filename.endswith('.txt') else filename
+            base, _ = split_attempt(stem)
+            if base == stem or base not in index:
+                index[base] = os.path.join(root, filename)
+    return index
+
+
+def iter_dataset_pairs(csv_path: str, outputs_dir: Optional[str] = None):
+    """Yield (row number, metadata, old text, new text) for every dataset row.
+
+    The new text is the 'after' column, or the LLM output for the row when
+    `outputs_dir` is given (rows without an output are skipped).
+    """
+    outputs = _index_outputs(outputs_dir) if outputs_dir else None
+    dataset = load_dataset(csv_path)
+    for row_number, row in enumerate(dataset, start=1):
+        meta = {
+            'repo': row.get('repo_name') or None,
+            'commit': row.get('commit') or None,
+            'rmv_lib': row.get('legacy_lib') or None,
+            'add_lib': row.get('target_lib') or None,
+            'type': row.get('type') or None,
+        }
+        old_text = row.get('code_before') or ''
+        if outputs is None:
+            new_text = row.get('code_after') or ''
+        else:
+            name = f"python_{meta['rmv_lib']}_{meta['add_lib']}{row['id']}"
+            path = outputs.get(name)
+            if path is None:
+                continue
+            with open(path, 'r', encoding='utf-8') as out:
+                new_text = out.read()
+        yield row_number, meta, old_text, new_text
+
+
+def analyze_pair(task) -> Tuple[Dict, List[Tuple]]:
+    """Worker: diff one pair and return its row summary and its non-equal line records."""
+    row_number, meta, old_text, new_text, options = task
+    diff = text_diff_compact(old_text, new_text, skip_equal=True, **options)
+    counts = diff.counts()
+    lines = [
+        (row_number, oi or None, nj or None, DIFF_TAGS[tag], round(float(sim), 2))
+        for oi, nj, tag, sim in zip(diff.old_index, diff.new_index, diff.tags, diff.similarity)
+    ]
+    modified = [round(float(sim), 2) for tag, sim in zip(diff.tags, diff.similarity) if tag == MODIFIED]
+    total = len(diff) + diff.equal_count
+    summary = {
+        'row': row_number, **meta,
+        'old_lines': len(diff.lines_old), 'new_lines': len(diff.lines_new),
+        **counts,
+        'changed_ratio': len(diff) / total if total else 0.0,
+        'mean_modified_similarity': sum(modified) / len(modified) if modified else None,
+    }
+    return summary, lines
+
+
+def _write_table(df, path_prefix: str) -> str:
+    """Write a table as Parquet when an engine is installed, CSV otherwise."""
+    try:
+        path = f"{path_prefix}.parquet"
+        df.to_parquet(path, index=False)
+    except ImportError:
+        path = f"{path_prefix}.csv"
+        df.to_csv(path, index=False)
+    return path
+
+
+def summarize_dataset(rows_df, lines_df) -> str:
+    """Aggregate statistics per removed/added library and change type."""
+    import numpy as np
+    import pandas as pd
+
+    report = []
+    report.append(f"Rows analysed: {len(rows_df)}")
+    report.append(f"Mean changed-line ratio: {rows_df['changed_ratio'].mean():.4f}")
+    report.append(f"Mean similarity of modified lines: {rows_df['mean_modified_similarity'].mean():.2f}%")
+
+    for key in ('rmv_lib', 'add_lib', 'type'):
+        grouped = rows_df.groupby(key, dropna=False).agg(
+            rows=('row', 'size'),
+            changed_ratio=('changed_ratio', 'mean'),
+            modified=('modified', 'sum'),
+            removed=('removed', 'sum'),
+            added=('added', 'sum'),
+            modified_similarity=('mean_modified_similarity', 'mean'),
+        ).sort_values('rows', ascending=False)
+        report.append(f"\nBy {key}:")
+        report.append(grouped.to_string(float_format=lambda v: f"{v:.3f}"))
+
+    modified = lines_df[lines_df['absolute_diff'] == 'modified'].merge(
+        rows_df[['row', 'rmv_lib', 'add_lib', 'type']], on='row', how='left'
+    )
+    if not modified.empty:
+        labels = [f"{lo}-{hi}" for lo, hi in zip(SIMILARITY_BINS[:-1], SIMILARITY_BINS[1:])]
+        modified['bucket'] = pd.cut(modified['similarity'], bins=np.array(SIMILARITY_BINS),
+                                    labels=labels, include_lowest=True)
+        for key in ('rmv_lib', 'add_lib', 'type'):
+            histogram = modified.groupby([key, 'bucket'], observed=False, dropna=False).size().unstack(fill_value=0)
+            report.append(f"\nModified-line similarity histogram (%) by {key}:")
+            report.append(histogram.to_string())
+    return "\n".join(report)
+
+
+def run_dataset_analysis(csv_path: str, output_prefix: str, outputs_dir: Optional[str] = None,
+                         jobs: int = 1, **options) -> str:
+    """Diff every row of the dataset across a process pool and write row/line tables plus a summary."""
+    import pandas as pd
+
+    tasks = ((row_number, meta, old_text, new_text, options)
+             for row_number, meta, old_text, new_text in iter_dataset_pairs(csv_path, outputs_dir))
+    rows: List[Dict] = []
+    lines: List[Tuple] = []
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(analyze_pair, tasks, chunksize=16))
+    else:
+        results = [analyze_pair(task) for task in tasks]
+    for summary, line_records in results:
+        rows.append(summary)
+        lines.extend(line_records)
+
+    rows_df = pd.DataFrame(rows, columns=ROW_COLUMNS)
+    lines_df = pd.DataFrame(lines, columns=LINE_COLUMNS)
+    rows_path = _write_table(rows_df, f"{output_prefix}_rows")
+    lines_path = _write_table(lines_df, f"{output_prefix}_lines")
+
+    report = summarize_dataset(rows_df, lines_df) if len(rows_df) else "No rows to analyse."
+    with open(f"{output_prefix}_summary.txt", 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+    print(f"\nPer-row records: {rows_path}\nPer-line records: {lines_path}\nSummary: {output_prefix}_summary.txt")
+    return report
 
 
 def main():
@@ -135,9 +595,33 @@ def main():
     parser.add_argument('--csv', default='input/python/treated_python_commits.csv', help='Path to CSV with before/after columns')
     parser.add_argument('--row', type=int, default=1, help='Row number in CSV to use (1-based)')
     parser.add_argument('--top', type=int, default=10, help='Top N modified lines to show in similarity mode')
+    parser.add_argument('--backend', choices=sorted(DIFF_BACKENDS), default='interned', help='Line diff algorithm')
+    parser.add_argument('--similarity', choices=sorted(SIMILARITY_BACKENDS), default='difflib',
+                        help="Per-line similarity ('rapidfuzz' is faster but approximate)")
+    parser.add_argument('--cutoff', type=float, default=None,
+                        help='Report 0 similarity for modified pairs that cannot reach this percentage')
+    parser.add_argument('--align', choices=['offset', 'best'], default='offset',
+                        help="Pair lines of a replaced block by position ('offset') or by similarity ('best')")
+    parser.add_argument('--min-similarity', type=float, default=50.0,
+                        help="With --align best, lines less similar than this stay unpaired")
+    parser.add_argument('--window', type=int, default=8,
+                        help="With --align best, how far from the block diagonal a pair may be")
+
+    parser.add_argument('--all', action='store_true', help='Analyse every row of the CSV instead of a single one')
+    parser.add_argument('--outputs', help="With --all, diff 'before' against the LLM outputs found under this folder "
+                                          "(e.g. output/python/ollama/<model>/zero_shot) instead of 'after'")
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Worker processes for --all')
+    parser.add_argument('--out', default='diff_results',
+                        help='With --all, prefix of the _rows/_lines tables and _summary.txt (default: diff_results)')
 
     args = parser.parse_args()
 
+    options = dict(backend=args.backend, similarity=args.similarity, cutoff=args.cutoff,
+                   align=args.align, min_similarity=args.min_similarity, window=args.window)
+    if args.all:
+        run_dataset_analysis(args.csv, args.out, outputs_dir=args.outputs, jobs=args.jobs, **options)
+        return
+
     old_text = None
     new_text = None
 
@@ -150,13 +634,13 @@ def main():
         # try CSV path
         try:
             row = _read_csv_row(args.csv, args.row)
-            old_text = row.get('before') or ''
-            new_text = row.get('after') or ''
+            old_text = row.get('code_before') or ''
+            new_text = row.get('code_after') or ''
         except Exception as e:
             print(f"Failed to read inputs: {e}")
             return
 
-    diff_results = text_diff_analysis(old_text, new_text)
+    diff_results = text_diff_analysis(old_text, new_text, **options)
 
     if args.mode == 'lines':
         print_lines_mode(diff_results)
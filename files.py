@@ -0,0 +1,27 @@
+import re
+
+# 'name(3)' -> ('name', '3'), 'name' -> ('name', None): repeated results for the same snippet.
+# The one definition of this naming scheme, shared by main, postprocess, diff_finder and get_codebleu_metric.
+ATTEMPT_SUFFIX = re.compile(r"^(.*?)(?:\((\d+)\))?$")
+
+
+def split_attempt(stem):
+    """'name(3)' -> ('name', 3); a first result has attempt 0."""
+    base, attempt = ATTEMPT_SUFFIX.match(stem).groups()
+    return base, int(attempt or 0)
+
+
+def write_if_changed(path, content):
+    """
+    Writes `content` to `path` unless the file already holds exactly it, so
+    unchanged outputs keep their mtime. Returns True if the file was written.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
@@ -1,80 +1,145 @@
-import pandas as pd
+import argparse
+import json
 import os
-import sys
+from concurrent.futures import ThreadPoolExecutor
 
+from dataset import load_dataset
+from files import write_if_changed
 
-def generate_text_files_from_df(df_path):
-    """
-    Reads a CSV DataFrame from a specified path and generates text files
-    in a subdirectory of the DataFrame's parent folder.
+DEFAULT_JOBS = 8
 
-    Args:
-        df_path (str): The full path to your CSV DataFrame (e.g., 'folder1/folder2/my_df.csv').
+
+def sanitize(series):
+    """Vectorized form of str(value).replace(os.sep, "_").replace("/", "_")."""
+    return series.astype(str).str.replace(os.sep, "_", regex=False).str.replace("/", "_", regex=False)
+
+
+def plan_example_files(df_path):
+    """
+    Computes the example file of every usable dataset row in one go.
+    Returns a DataFrame with the columns row (0-based), directory, path,
+    relative_path (to the dataset's folder) and content, or None if the
+    dataset cannot be read.
     """
     if not os.path.exists(df_path):
         print(
             f"Error: DataFrame not found at '{df_path}'. Please check the path and try again."
         )
-        return
+        return None
 
     try:
-        df = pd.read_csv(df_path)
+        df = load_dataset(df_path).to_frame(["repo_name", "commit", "legacy_lib", "code_before"])
     except Exception as e:
         print(f"Error reading DataFrame from '{df_path}': {e}")
-        return
+        return None
 
     print(f"Successfully loaded DataFrame from '{df_path}'. Processing rows...")
 
-    base_output_dir = os.path.dirname(df_path)
-
-    for index, row in df.iterrows():
-        before_content = row.get("before")
-        rmv_lib_value = row.get("rmv_lib")
-        repo_name = row.get("repo")
-        commit_hash = row.get("commit")
+    no_lib = df["legacy_lib"].str.strip() == ""
+    missing = ~no_lib & ((df["repo_name"] == "") | (df["commit"] == ""))
+    for index in df.index[no_lib]:
+        print(f"Skipping row {index} because 'rmv_lib' is empty.")
+    for index in df.index[missing]:
+        print(f"Skipping row {index} due to missing 'before', 'repo', or 'commit' data.")
+    df = df[~(no_lib | missing)]
 
-        if pd.isna(rmv_lib_value) or str(rmv_lib_value).strip() == "":
-            print(f"Skipping row {index} because 'rmv_lib' is empty.")
-            continue
+    base_output_dir = os.path.dirname(df_path)
+    prefix = base_output_dir + os.sep if base_output_dir else ""
+    relative_dir = sanitize(df["legacy_lib"]) + os.sep + sanitize(df["repo_name"])
+    relative_path = relative_dir + os.sep + sanitize(df["commit"]) + " - " + (df.index + 1).astype(str) + ".txt"
+    return df.assign(row=df.index, directory=prefix + relative_dir, relative_path=relative_path,
+                     path=prefix + relative_path, content=df["code_before"])
 
-        if before_content is None or repo_name is None or commit_hash is None:
-            print(
-                f"Skipping row {index} due to missing 'before', 'repo', or 'commit' data."
-            )
-            continue
 
-        sanitized_repo = str(repo_name).replace(os.sep, "_").replace("/", "_")
-        sanitized_commit = str(commit_hash).replace(os.sep, "_").replace("/", "_")
-        sanitized_rmv_lib = str(rmv_lib_value).replace(os.sep, "_").replace("/", "_")
+def generate_text_files_from_df(df_path, jobs=DEFAULT_JOBS, verbose=False):
+    """
+    Reads a CSV DataFrame from a specified path and generates text files
+    in a subdirectory of the DataFrame's parent folder.
 
-        target_file_dir = os.path.join(
-            base_output_dir, sanitized_rmv_lib, sanitized_repo
-        )
+    Args:
+        df_path (str): The full path to your CSV DataFrame (e.g., 'folder1/folder2/my_df.csv').
+        jobs (int): Number of threads writing files.
+        verbose (bool): Print every generated file instead of a summary.
+    """
+    plan = plan_example_files(df_path)
+    if plan is None:
+        return
 
+    failed_dirs = set()
+    for directory in plan["directory"].unique():
         try:
-            os.makedirs(target_file_dir, exist_ok=True)
+            os.makedirs(directory, exist_ok=True)
         except OSError as e:
-            print(f"Error creating directory '{target_file_dir}' for row {index}: {e}")
-            continue
-
-        filename = f"{sanitized_commit} - {index + 1}.txt"
-        file_path = os.path.join(target_file_dir, filename)
+            print(f"Error creating directory '{directory}': {e}")
+            failed_dirs.add(directory)
+    plan = plan[~plan["directory"].isin(failed_dirs)]
 
+    def write(task):
+        index, file_path, content = task
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(str(before_content))
-            print(f"Generated: '{file_path}'")
+            written = write_if_changed(file_path, content)
         except IOError as e:
-            print(f"Error writing file '{file_path}' for row {index}: {e}")
+            return f"Error writing file '{file_path}' for row {index}: {e}"
+        if written:
+            return f"Generated: '{file_path}'"
+        return None
+
+    generated = unchanged = errors = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for message in executor.map(write, zip(plan["row"], plan["path"], plan["content"])):
+            if message is None:
+                unchanged += 1
+                continue
+            if message.startswith("Error"):
+                errors += 1
+                print(message)
+            else:
+                generated += 1
+                if verbose:
+                    print(message)
+
+    print(f"Generated {generated} file(s), {unchanged} unchanged, {errors} error(s).")
+
+
+def generate_jsonl_from_df(df_path, output_path):
+    """
+    Packed alternative to generate_text_files_from_df: writes one JSON line
+    per example to a single file instead of one .txt file per row. Each line
+    holds the example's path relative to the dataset's folder, its row,
+    repo_name, commit, legacy_lib and code_before.
+    """
+    plan = plan_example_files(df_path)
+    if plan is None:
+        return
 
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for row, path, repo_name, commit, legacy_lib, content in zip(
+            plan["row"], plan["relative_path"], plan["repo_name"], plan["commit"], plan["legacy_lib"], plan["content"]
+        ):
+            f.write(json.dumps({
+                "path": path, "row": int(row), "repo_name": repo_name, "commit": commit,
+                "legacy_lib": legacy_lib, "code_before": content,
+            }) + "\n")
+    os.replace(temp_path, output_path)
+    print(f"Packed {len(plan)} example(s) into '{output_path}'.")
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python your_script_name.py <path_to_dataframe.csv>")
-        print("Example: python generate_files.py folder1/folder2/my_df.csv")
-        sys.exit(1)
 
-    dataframe_file_path = sys.argv[1]
-    generate_text_files_from_df(dataframe_file_path)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generate one input example per dataset row, under the dataset's folder."
+    )
+    parser.add_argument("df_path", help="Path to the dataset, e.g. input/python/treated_python_commits.csv")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS,
+                        help=f"Threads writing files (default: {DEFAULT_JOBS}).")
+    parser.add_argument("--jsonl", metavar="PATH",
+                        help="Write every example into a single JSONL file instead of .txt files.")
+    parser.add_argument("--verbose", action="store_true", help="Print every generated file.")
+    args = parser.parse_args()
+
+    if args.jsonl:
+        generate_jsonl_from_df(args.df_path, args.jsonl)
+    else:
+        generate_text_files_from_df(args.df_path, jobs=args.jobs, verbose=args.verbose)
 
     print("\nProcess finished.")
@@ -1,134 +1,295 @@
+import argparse
 import os
-import pandas as pd
 import logging
-from codebleu import calc_codebleu
 
-# --- Configuration ---
+from codebleu_engine import default_jobs, score_pairs
+from dataset import load_dataset
+from files import split_attempt
+from score_store import DEFAULT_SCORE_STORE, ScoreStore, content_hash
 
-# 📂 DIRECTORY PATHS (NEW: UPDATE THESE PATHS)
-# Set the path to the folder containing your CSV files.
-CSV_DIRECTORY = './input/python' 
-# Set the path to the folder that contains the 'zero_shot', 'one_shot', etc. folders.
-MODEL_NAME = "codeqwen:latest"
-SNIPPETS_DIRECTORY = f'./parsed/python/ollama/{MODEL_NAME}' 
+# usage: python get_codebleu_metric.py [--models codeqwen:latest ...] [--templates zero_shot ...]
+#                                      [--datasets Boto-Boto3.csv ...] [--jobs N]
+# Every model found under parsed/<language>/<family>/<version> is scored unless --models is given.
+
+# --- Default configuration (overridable from the command line) ---
+
+# Folder containing the CSV files with the ground truth.
+CSV_DIRECTORY = './input/python'
+# Folder containing parsed/<language>/<family>/<version>/<template>/<repo>/ snippets.
+PARSED_DIRECTORY = './parsed'
+LANGUAGE = 'python'
 
 # List of your CSV files (just the filenames)
 CSV_FILES = ['Boto-Boto3.csv', 'Request-Urllib.csv']
 
-# Folders containing the generated code snippets (just the folder names)
-GENERATION_FOLDERS = ['zero_shot/code-migration', 'one_shot/code-migration', 'chain_of_thoughts/code-migration']
+# Prompt templates whose generations are scored
+TEMPLATES = ['zero_shot', 'one_shot', 'chain_of_thoughts']
 
 # Output filenames
-DETAILED_LOG_FILE = f'{MODEL_NAME}_analysis.log'
-SUMMARY_REPORT_FILE = f'{MODEL_NAME}_summary_report.txt'
+DETAILED_LOG_FILE = 'analysis.log'
+COMPARISON_REPORT_FILE = 'comparison_report.txt'
+# Scores are kept here across runs; only new or changed snippets are rescored.
+SCORE_STORE_FILE = DEFAULT_SCORE_STORE
 
-# --- Logger Setup ---
 logger = logging.getLogger('MigrationAnalysis')
-logger.setLevel(logging.INFO)
-if logger.hasHandlers():
-    logger.handlers.clear()
-file_handler = logging.FileHandler(DETAILED_LOG_FILE, mode='w')
-file_handler.setFormatter(
-    logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-)
-logger.addHandler(file_handler)
-stream_handler = logging.StreamHandler()
-stream_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
-logger.addHandler(stream_handler)
-
-
-def analyze_migrations():
+
+
+def setup_logger(log_file=DETAILED_LOG_FILE):
+    """Sends the analysis log to `log_file` and to the console."""
+    logger.setLevel(logging.INFO)
+    if logger.hasHandlers():
+        logger.handlers.clear()
+    file_handler = logging.FileHandler(log_file, mode='w')
+    file_handler.setFormatter(
+        logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    )
+    logger.addHandler(file_handler)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
+    logger.addHandler(stream_handler)
+
+
+def list_subdirectories(path):
+    try:
+        return sorted(entry.name for entry in os.scandir(path) if entry.is_dir())
+    except FileNotFoundError:
+        return []
+
+
+def discover_models(parsed_directory=PARSED_DIRECTORY, language=LANGUAGE):
+    """Maps '<family>/<version>' to its snippets directory, e.g. 'ollama/codeqwen:latest'."""
+    language_dir = os.path.join(parsed_directory, language)
+    models = {}
+    for family in list_subdirectories(language_dir):
+        for version in list_subdirectories(os.path.join(language_dir, family)):
+            models[f"{family}/{version}"] = os.path.join(language_dir, family, version)
+    return models
+
+
+def select_models(discovered, requested=None):
+    """Keeps the requested models, given either as '<family>/<version>' or just '<version>'."""
+    if not requested:
+        return discovered
+    selected = {}
+    for name in requested:
+        matches = {
+            model_id: path for model_id, path in discovered.items()
+            if model_id == name or model_id.split('/', 1)[1] == name
+        }
+        if not matches:
+            logger.warning(f"No snippets found for model '{name}'. Skipping.")
+        selected.update(matches)
+    return selected
+
+
+def discover_generation_folders(model_directory, templates=TEMPLATES):
+    """Lists the '<template>/<repo>' folders of a model, in template order."""
+    return [
+        f"{template}/{repo}"
+        for template in templates
+        for repo in list_subdirectories(os.path.join(model_directory, template))
+    ]
+
+
+def load_references(csv_directory=CSV_DIRECTORY, csv_files=CSV_FILES):
     """
-    Main function to orchestrate the analysis of code migration snippets.
+    Parses every dataset once. Returns {csv_file: [migration dicts]}, where
+    each migration carries its ground truth and the hash of it.
     """
-    all_results = []
+    references = {}
+    for csv_file in csv_files:
+        csv_path = os.path.join(csv_directory, csv_file)
 
-    for csv_file in CSV_FILES:
-        # Build the full path to the CSV file (CHANGED)
-        csv_path = os.path.join(CSV_DIRECTORY, csv_file)
-        
         if not os.path.exists(csv_path):
             logger.warning(f"CSV file not found: {csv_path}. Skipping.")
             continue
 
-        logger.info(f"--- Processing migrations from {csv_path} ---")
-        df = pd.read_csv(csv_path)
-
-        for index, row in df.iterrows():
-            migration_id = row['id']
-            migration_type = row['type']
-            source_lib = row['legacy_lib']
-            target_lib = row['target_lib']
-            ground_truth_code = str(row['code_after'])
-
-            for folder in GENERATION_FOLDERS:
-                # --- Fallback Logic (CHANGED) ---
-                # 1. Define the primary and fallback (inverted) filenames
-                primary_filename = f"python_{source_lib}_{target_lib}{migration_id}.txt"
-                fallback_filename = f"python_{target_lib}_{source_lib}{migration_id}.txt"
-
-                # 2. Build full paths for both possibilities
-                primary_path = os.path.join(SNIPPETS_DIRECTORY, folder, primary_filename)
-                fallback_path = os.path.join(SNIPPETS_DIRECTORY, folder, fallback_filename)
-                
-                path_to_open = None
-                
-                # 3. Check for the primary path first, then the fallback path
-                if os.path.exists(primary_path):
-                    path_to_open = primary_path
-                elif os.path.exists(fallback_path):
-                    path_to_open = fallback_path
-                    logger.info(
-                        f"[{migration_type} ID: {migration_id}] [{folder}] -> "
-                        f"Primary name not found. Using fallback: {fallback_filename}"
-                    )
-                
-                # 4. Process the file if it was found (either primary or fallback)
-                if path_to_open:
-                    with open(path_to_open, 'r', encoding='utf-8') as f:
-                        prediction_code = f.read()
-
-                    result = calc_codebleu(
-                        predictions=[prediction_code],
-                        references=[[ground_truth_code]],
-                        lang='python'
-                    )
-                    
-                    codebleu_score = result['codebleu']
-
-                    logger.info(
-                        f"[{migration_type} ID: {migration_id}] [{folder}] -> "
-                        f"CodeBLEU: {codebleu_score:.4f}"
-                    )
-
-                    all_results.append({
-                        'migration_file': csv_file, 'migration_type': migration_type,
-                        'id': migration_id, 'method': folder, 'score': codebleu_score
-                    })
-                else:
-                    # If neither file was found, log the failure
-                    logger.warning(
-                        f"[{migration_type} ID: {migration_id}] [{folder}] -> "
-                        f"File not found. Tried: {primary_path} and {fallback_path}"
-                    )
-                    all_results.append({
-                        'migration_file': csv_file, 'migration_type': migration_type,
-                        'id': migration_id, 'method': folder, 'score': None
-                    })
-
-    if all_results:
-        generate_summary_report(all_results, filename=SUMMARY_REPORT_FILE)
-    else:
-        logger.info("No results were generated. Please check your file paths and configurations.")
+        dataset = load_dataset(csv_path)
+        migrations = []
+        for migration_id, migration_type, source_lib, target_lib, code_after in zip(
+            *(dataset.column(name) for name in ('id', 'type', 'legacy_lib', 'target_lib', 'code_after'))
+        ):
+            ground_truth_code = str(code_after)
+            migrations.append({
+                'id': migration_id, 'type': migration_type,
+                'source_lib': source_lib, 'target_lib': target_lib,
+                'code_after': ground_truth_code, 'reference_hash': content_hash(ground_truth_code)
+            })
+        references[csv_file] = migrations
+    return references
 
 
-def generate_summary_report(results, filename):
+class SnippetIndex:
     """
-    Calculates, prints, and saves a summary of the average CodeBLEU scores.
+    One-pass os.scandir index of a generation folder, mapping each snippet
+    name (without '.txt' and without a '(n)' duplicate suffix) to its file.
+    When duplicates exist, the unsuffixed file wins, then the lowest n.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.files = {}
+        self.duplicates = 0
+        self.matched = set()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.') or not entry.is_file():
+                        continue
+                    stem = entry.name[:-4] if entry.name.endswith('.txt') else entry.name
+                    base, copy = split_attempt(stem)
+                    self.files.setdefault(base, []).append((copy, entry.path))
+        except FileNotFoundError:
+            pass
+        for candidates in self.files.values():
+            candidates.sort()
+            self.duplicates += len(candidates) - 1
+
+    def lookup(self, name):
+        candidates = self.files.get(name)
+        if not candidates:
+            return None
+        self.matched.add(name)
+        return candidates[0][1]
+
+    def unmatched(self):
+        """Snippet names that no migration asked for."""
+        return sorted(set(self.files) - self.matched)
+
+
+def find_snippet(index, folder, migration):
+    """Path of the generated snippet for a migration, or None if there is none."""
+    migration_id = migration['id']
+    migration_type = migration['type']
+    # 1. Define the primary and fallback (inverted) names
+    primary_name = f"python_{migration['source_lib']}_{migration['target_lib']}{migration_id}"
+    fallback_name = f"python_{migration['target_lib']}_{migration['source_lib']}{migration_id}"
+
+    # 2. Look up the primary name first, then the fallback name
+    path = index.lookup(primary_name)
+    if path:
+        return path
+    path = index.lookup(fallback_name)
+    if path:
+        logger.info(
+            f"[{migration_type} ID: {migration_id}] [{folder}] -> "
+            f"Primary name not found. Using fallback: {os.path.basename(path)}"
+        )
+        return path
+
+    # If neither file was found, log the failure
+    logger.warning(
+        f"[{migration_type} ID: {migration_id}] [{folder}] -> "
+        f"File not found. Tried: {primary_name} and {fallback_name} in {index.directory}"
+    )
+    return None
+
+
+def report_unmatched(model_id, folder, index, missing):
+    """Logs both sides of the matching: migrations without a snippet and snippets without a migration."""
+    unmatched = index.unmatched()
+    logger.info(
+        f"[{model_id}] [{folder}] -> {len(index.matched)} snippet(s) matched, "
+        f"{missing} migration(s) without snippet, {len(unmatched)} file(s) without migration, "
+        f"{index.duplicates} duplicate(s) ignored"
+    )
+    if unmatched:
+        preview = ', '.join(unmatched[:10]) + (' ...' if len(unmatched) > 10 else '')
+        logger.warning(f"[{model_id}] [{folder}] -> Snippets matching no migration: {preview}")
+
+
+def analyze_migrations(models, references, templates=TEMPLATES, jobs=1, rescore=False,
+                       score_store_file=SCORE_STORE_FILE, report_file=COMPARISON_REPORT_FILE, language=LANGUAGE):
     """
+    Main function to orchestrate the analysis of code migration snippets.
+
+    `models` maps model ids to snippet directories and `references` comes
+    from load_references, so the datasets are parsed once for the whole
+    matrix. Snippets of every model are collected first, the ones without a
+    stored score are scored in a single batch (in parallel when jobs > 1),
+    and one comparison report is written at the end. Snippets are scored as
+    `language` code.
+    """
+    store = ScoreStore(score_store_file)
+    records = []
+    pending = []
+    reused = 0
+    model_folders = {}
+
+    for model_id, model_directory in models.items():
+        folders = discover_generation_folders(model_directory, templates)
+        model_folders[model_id] = folders
+        logger.info(f"=== Model {model_id}: {len(folders)} generation folder(s) ===")
+        indexes = {folder: SnippetIndex(os.path.join(model_directory, folder)) for folder in folders}
+        missing = dict.fromkeys(folders, 0)
+
+        for csv_file, migrations in references.items():
+            logger.info(f"--- Processing migrations from {csv_file} ---")
+
+            for migration in migrations:
+                for folder in folders:
+                    path_to_open = find_snippet(indexes[folder], folder, migration)
+                    if not path_to_open:
+                        missing[folder] += 1
+
+                    record = {
+                        'model': model_id, 'method': folder, 'migration_file': csv_file,
+                        'migration_id': migration['id'], 'migration_type': migration['type'],
+                        'prediction_hash': None, 'reference_hash': migration['reference_hash'],
+                        'score': None
+                    }
+                    records.append(record)
+
+                    # Reuse the stored score or queue the file for scoring if it was found
+                    if path_to_open:
+                        with open(path_to_open, 'r', encoding='utf-8') as f:
+                            prediction_code = f.read()
+                        record['prediction_hash'] = content_hash(prediction_code)
+                        stored_score = None if rescore else store.lookup(
+                            model_id, folder, csv_file, migration['id'],
+                            record['prediction_hash'], record['reference_hash']
+                        )
+                        if stored_score is not None:
+                            record['score'] = stored_score
+                            reused += 1
+                        else:
+                            pending.append((record, prediction_code, migration['code_after']))
+
+        for folder in folders:
+            report_unmatched(model_id, folder, indexes[folder], missing[folder])
+
+    logger.info(f"Reusing {reused} stored score(s); {len(pending)} snippet(s) are new or changed.")
+    if pending:
+        logger.info(f"Scoring {len(pending)} snippets with {jobs} job(s)...")
+        scores = score_pairs(
+            [(prediction, reference) for _, prediction, reference in pending], jobs=jobs, lang=language
+        )
+        for (record, _, _), codebleu_score in zip(pending, scores):
+            record['score'] = codebleu_score
+            logger.info(
+                f"[{record['model']}] [{record['migration_type']} ID: {record['migration_id']}] "
+                f"[{record['method']}] -> CodeBLEU: {codebleu_score:.4f}"
+            )
+
+    store.save_many(records)
+    results_by_model = {
+        model_id: store.load_results(model_id, migration_files=list(references), methods=folders)
+        for model_id, folders in model_folders.items()
+    }
+    store.close()
+
+    if any(results_by_model.values()):
+        generate_comparison_report(results_by_model, filename=report_file, templates=templates)
+    else:
+        logger.info("No results were generated. Please check your file paths and configurations.")
+
+
+def summary_lines(results):
+    """Per-dataset, per-method averages of a single model's results."""
+    import pandas as pd
+
     results_df = pd.DataFrame(results)
     report_lines = []
-    report_lines.append("="*25 + " ANALYSIS SUMMARY " + "="*25)
 
     for csv_file, file_group in results_df.groupby('migration_file'):
         report_lines.append(f"\n📊 Results for: {csv_file}")
@@ -141,10 +302,12 @@ def generate_summary_report(results, filename):
             report_lines.append(f"  - Method: {row['method']}")
             report_lines.append(f"    - Average CodeBLEU: {row['Average CodeBLEU']:.4f}")
             report_lines.append(f"    - Snippets Compared: {int(row['Samples Found'])}/{int(row['Total Samples'])}")
-    
-    report_lines.append("\n" + "="*68)
+    return report_lines
+
+
+def write_report(report_lines, filename):
     final_report = "\n".join(report_lines)
-    
+
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(final_report)
@@ -155,5 +318,93 @@ def generate_summary_report(results, filename):
     print(final_report)
 
 
+def generate_summary_report(results, filename):
+    """
+    Calculates, prints, and saves a summary of the average CodeBLEU scores.
+    """
+    report_lines = ["="*25 + " ANALYSIS SUMMARY " + "="*25]
+    report_lines.extend(summary_lines(results))
+    report_lines.append("\n" + "="*68)
+    write_report(report_lines, filename)
+
+
+def generate_comparison_report(results_by_model, filename, templates=TEMPLATES):
+    """
+    Prints and saves one report for the whole matrix: a model x template
+    table of average CodeBLEU scores, followed by each model's summary.
+    """
+    import pandas as pd
+
+    report_lines = ["="*25 + " MODEL COMPARISON " + "="*25]
+
+    all_results = pd.DataFrame([
+        {**result, 'model': model_id}
+        for model_id, results in results_by_model.items()
+        for result in results
+    ])
+    if not all_results.empty:
+        all_results['template'] = all_results['method'].str.split('/').str[0]
+        table = all_results.pivot_table(index='model', columns='template', values='score', aggfunc='mean')
+        table = table.reindex(columns=[t for t in templates if t in table.columns])
+        report_lines.append("\nAverage CodeBLEU per model and template:\n")
+        report_lines.append(table.to_string(float_format=lambda score: f"{score:.4f}", na_rep="-"))
+
+    for model_id, results in results_by_model.items():
+        if not results:
+            continue
+        report_lines.append("\n" + "="*25 + f" {model_id} " + "="*25)
+        report_lines.extend(summary_lines(results))
+
+    report_lines.append("\n" + "="*68)
+    write_report(report_lines, filename)
+
+
 if __name__ == "__main__":
-    analyze_migrations()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Score migrated snippets against the ground truth with CodeBLEU.")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        help="Models to score, as '<family>/<version>' or '<version>' (default: every model found)."
+    )
+    parser.add_argument(
+        "--templates",
+        nargs="+",
+        default=TEMPLATES,
+        help=f"Prompt templates to score (default: {' '.join(TEMPLATES)})."
+    )
+    parser.add_argument(
+        "--datasets",
+        nargs="+",
+        default=CSV_FILES,
+        help=f"CSV files with the ground truth, relative to --csv-dir (default: {' '.join(CSV_FILES)})."
+    )
+    parser.add_argument("--csv-dir", default=CSV_DIRECTORY, help=f"Folder containing the datasets (default: {CSV_DIRECTORY}).")
+    parser.add_argument("--parsed-dir", default=PARSED_DIRECTORY, help=f"Folder containing the parsed snippets (default: {PARSED_DIRECTORY}).")
+    parser.add_argument("--language", default=LANGUAGE, help=f"Programming language of the snippets (default: {LANGUAGE}).")
+    parser.add_argument("--report", default=COMPARISON_REPORT_FILE, help=f"Combined report file (default: {COMPARISON_REPORT_FILE}).")
+    parser.add_argument("--log", default=DETAILED_LOG_FILE, help=f"Detailed log file (default: {DETAILED_LOG_FILE}).")
+    parser.add_argument("--store", default=SCORE_STORE_FILE, help=f"Score store (default: {SCORE_STORE_FILE}).")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes used for scoring (default: number of CPUs; 1 scores serially)."
+    )
+    parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="Ignore the scores stored in the score store and compute every snippet again."
+    )
+    args = parser.parse_args()
+
+    setup_logger(args.log)
+    models = select_models(discover_models(args.parsed_dir, args.language), args.models)
+    if not models:
+        logger.error(f"No models to score under '{os.path.join(args.parsed_dir, args.language)}'.")
+    else:
+        logger.info(f"Scoring {len(models)} model(s): {', '.join(models)}")
+        references = load_references(args.csv_dir, args.datasets)
+        analyze_migrations(
+            models, references, templates=args.templates, jobs=args.jobs, rescore=args.rescore,
+            score_store_file=args.store, report_file=args.report, language=args.language
+        )
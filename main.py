@@ -1,48 +1,250 @@
 import argparse
+import hashlib
+import json
 import os
+import threading
+import time
 
-from models.gpt_client import GPTClient
-from models.ollama_client import OllamaClient
+from files import split_attempt
+from models import get_client_class
+from models.metrics import TRACE_NAME, MetricsRecorder
+from models.response_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_SIZE_MB, ResponseCache
+from parser import DEFAULT_POLICY, POLICIES
 from pathlib import Path
+from postprocess import PostProcessor, strip_think
 
 
-def get_client_by_model(model_name):
-    if model_name == "gpt":
-        return GPTClient()
-    elif model_name == "ollama":
-        return OllamaClient()
-    else:
-        raise Exception(f"Unsupported model: {model_name}")
+def get_client_by_model(model_name, pull=True, keep_alive=None, budget=True, max_context=None, **options):
+    client_class = get_client_class(model_name)
+    if model_name == "ollama":
+        return client_class(pull=pull, keep_alive=keep_alive, budget=budget, max_context=max_context, **options)
+    return client_class(**options)
 
 
-def save_result_to_file(input_path, language_name, model_name, version_name, result_content, prompt_template):
+def keep_alive_value(value):
+    """'30m' stays a duration string; plain numbers (seconds, -1 for forever) are sent as numbers."""
     try:
-        has_think_tag = '<think>' in result_content
+        return float(value)
+    except ValueError:
+        return value
+
+
+def add_model_availability_arguments(parser):
+    parser.add_argument(
+        "--no-pull",
+        action="store_true",
+        help="Never pull models from the registry; fail if a model is not available locally."
+    )
+    parser.add_argument(
+        "--ensure-models",
+        action="store_true",
+        help="Check (and pull, unless --no-pull) every model up front, before any migration runs."
+    )
+    parser.add_argument(
+        "--keep-alive",
+        type=keep_alive_value,
+        default=None,
+        help="How long Ollama keeps the model loaded after each request, e.g. 30m or -1 "
+             "(default: %(default)s; None keeps the server setting)."
+    )
+
+
+def add_generation_arguments(parser):
+    parser.add_argument(
+        "--max-context",
+        type=int,
+        default=None,
+        help="Largest num_ctx sent to Ollama, below the model's own context length (default: no extra limit)."
+    )
+    parser.add_argument(
+        "--no-budget",
+        action="store_true",
+        help="Send Ollama requests without num_ctx/num_predict and wall-clock limits sized from the prompt."
+    )
+
+
+def generation_options(args):
+    return {"budget": not args.no_budget, "max_context": args.max_context}
+
+
+def ensure_models(client, versions):
+    """Preflight check; a no-op for clients without local models."""
+    if not hasattr(client, "ensure_model"):
+        return
+    for version in versions:
+        client.ensure_model(version)
+        print(f"Model {version} is available.")
+
+
+def add_streaming_arguments(parser):
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream tokens from the model and record time to first token and tokens/s."
+    )
+    parser.add_argument(
+        "--stop-at-code-block",
+        action="store_true",
+        help="Cancel generation once the first code block is closed (implies --stream)."
+    )
+
+
+def streaming_options(args):
+    return {"stream": args.stream, "stop_at_code_block": args.stop_at_code_block}
+
+
+def format_stats(stats):
+    ttft = "-" if stats["ttft"] is None else f"{stats['ttft']:.2f}s"
+    rate = "-" if stats["tokens_per_second"] is None else f"{stats['tokens_per_second']:.1f}"
+    early = ", stopped after first code block" if stats["stopped_early"] else ""
+    return f"TTFT: {ttft}, {stats['tokens']} tokens in {stats['duration']:.2f}s ({rate} tokens/s){early}"
+
+
+def add_cache_arguments(parser):
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=DEFAULT_CACHE_PATH,
+        default=None,
+        help=f"Reuse responses stored in a SQLite cache (default path: {DEFAULT_CACHE_PATH})."
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=DEFAULT_MAX_SIZE_MB,
+        help=f"Maximum cache size in MB before least recently used responses are evicted (default: {DEFAULT_MAX_SIZE_MB})."
+    )
 
-        if has_think_tag:
-            processed_content = result_content.split('</think>', 1)[-1].lstrip()
-        else:
-            processed_content = result_content
 
-        path_obj = Path(input_path)
-        repo_name = path_obj.parts[3]
-        original_filename = path_obj.name
+def attach_cache(client, args):
+    if args.cache:
+        client.cache = ResponseCache(args.cache, max_size_mb=args.cache_size)
+    return client
 
-        output_dir = Path("output") / language_name / model_name / version_name / prompt_template / repo_name
+
+def add_postprocess_arguments(parser):
+    parser.add_argument(
+        "--parse",
+        nargs="?",
+        const=DEFAULT_POLICY,
+        choices=POLICIES,
+        default=None,
+        help=f"Also write the extracted code to parsed/, as parser.py would, using the given policy (default: {DEFAULT_POLICY})."
+    )
+
+
+def make_postprocessor(args, score_store_file=None):
+    """A PostProcessor for --parse; scoring implies parsing with the default policy."""
+    if not args.parse and not score_store_file:
+        return None
+    return PostProcessor(policy=args.parse or DEFAULT_POLICY, score_store_file=score_store_file)
+
+
+def add_trace_arguments(parser):
+    parser.add_argument(
+        "--no-trace",
+        action="store_true",
+        help=f"Do not append per-request metrics to output/<language>/<model>/<version>/{TRACE_NAME}."
+    )
+    # Lets run_migrations.py --subprocess gather the entries of its child processes.
+    parser.add_argument("--trace-run-id", default=None, help=argparse.SUPPRESS)
+
+
+def get_trace_path(language_name, model_name, version_name):
+    return Path("output") / language_name / model_name / version_name / TRACE_NAME
+
+
+def attach_metrics(client, args, language_name, model_name, version_name):
+    """Records every request of `client`; the trace file is skipped with --no-trace."""
+    trace_path = None if args.no_trace else get_trace_path(language_name, model_name, version_name)
+    client.metrics = MetricsRecorder(trace_path, run_id=args.trace_run_id)
+    return client
+
+
+def get_output_dir(input_path, language_name, model_name, version_name, prompt_template):
+    repo_name = Path(input_path).parts[3]
+    return Path("output") / language_name / model_name / version_name / prompt_template / repo_name
+
+
+# Per-directory manifest of saved results; dotfiles are skipped by the parser and the scorer.
+MANIFEST_NAME = ".manifest.jsonl"
+
+
+_next_attempts = {}
+_attempts_lock = threading.Lock()
+
+
+def _scan_attempts(output_dir):
+    """Next free attempt number of every result name in `output_dir`, from a single scandir."""
+    attempts = {}
+    with os.scandir(output_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            stem, suffix = os.path.splitext(entry.name)
+            base, attempt = split_attempt(stem)
+            name = base + suffix
+            attempts[name] = max(attempts.get(name, 0), attempt + 1)
+    return attempts
+
+
+def write_new_output_file(output_dir, filename, content):
+    """
+    Writes `content` to a file that did not exist before: `filename` for the
+    first result, then 'stem(1)suffix', 'stem(2)suffix', ... The directory is
+    scanned once per process; after that the next attempt number comes from
+    memory, and O_EXCL keeps concurrent writers (threads or processes) from
+    ever sharing a file.
+    """
+    directory = str(output_dir)
+    stem, suffix = os.path.splitext(filename)
+    while True:
+        with _attempts_lock:
+            attempts = _next_attempts.get(directory)
+            if attempts is None:
+                attempts = _next_attempts[directory] = _scan_attempts(directory)
+            attempt = attempts.get(filename, 0)
+            attempts[filename] = attempt + 1
+
+        name = filename if attempt == 0 else f"{stem}({attempt}){suffix}"
+        path = Path(directory) / name
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            # Taken by another process since the scan; move on to the next number.
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+
+def append_to_manifest(output_dir, entry):
+    """Appends one JSON line; a single O_APPEND write keeps concurrent lines whole."""
+    line = (json.dumps(entry) + "\n").encode("utf-8")
+    fd = os.open(Path(output_dir) / MANIFEST_NAME, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+def save_result_to_file(input_path, language_name, model_name, version_name, result_content, prompt_template,
+                        postprocessor=None, migration=None):
+    """
+    Saves a completion under output/ (and its <think> version under raw/).
+    With a postprocessor, the extracted code is also written to parsed/ and,
+    given the `migration` it came from, scored in the same call.
+    """
+    try:
+        has_think_tag = '<think>' in result_content
+        processed_content = strip_think(result_content)
+
+        original_filename = Path(input_path).name
+
+        output_dir = get_output_dir(input_path, language_name, model_name, version_name, prompt_template)
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        output_file_path = output_dir / original_filename
-        counter = 1
-        
-        file_stem = output_file_path.stem
-        file_suffix = output_file_path.suffix
-        
-        while output_file_path.exists():
-            new_filename = f"{file_stem}({counter}){file_suffix}"
-            output_file_path = output_dir / new_filename
-            counter += 1
-            
-        output_file_path.write_text(processed_content, encoding="utf-8")
+        output_file_path = write_new_output_file(output_dir, original_filename, processed_content)
 
         if has_think_tag:
             raw_output_dir = output_dir / "raw"
@@ -50,7 +252,19 @@ def save_result_to_file(input_path, language_name, model_name, version_name, res
             # Use the 'name' of the unique path for the raw file to ensure they match
             raw_output_file_path = raw_output_dir / output_file_path.name
             raw_output_file_path.write_text(result_content, encoding="utf-8")
-            
+
+        append_to_manifest(output_dir, {
+            "file": output_file_path.name,
+            "source": original_filename,
+            "model": model_name,
+            "version": version_name,
+            "prompt": prompt_template,
+            "sha256": hashlib.sha256(processed_content.encode("utf-8")).hexdigest(),
+            "raw": has_think_tag,
+            "saved_at": time.time(),
+        })
+        if postprocessor is not None:
+            postprocessor.process(output_file_path, result_content, migration)
         return str(output_file_path)
 
     except IndexError:
@@ -73,11 +287,22 @@ def main():
     parser.add_argument(
         "INPUT_PATH", help="Input file path (e.g., input/python/boto/ex.txt)"
     )
+    add_model_availability_arguments(parser)
+    add_generation_arguments(parser)
+    add_cache_arguments(parser)
+    add_streaming_arguments(parser)
+    add_postprocess_arguments(parser)
+    add_trace_arguments(parser)
 
     args = parser.parse_args()
 
     try:
-        client = get_client_by_model(args.MODEL)
+        client = get_client_by_model(args.MODEL, pull=not args.no_pull, keep_alive=args.keep_alive,
+                                     **generation_options(args), **streaming_options(args))
+        attach_cache(client, args)
+        attach_metrics(client, args, args.LANGUAGE_NAME, args.MODEL, args.VERSION)
+        if args.ensure_models:
+            ensure_models(client, [args.VERSION])
         result = client.process(args)
         saved_path = save_result_to_file(
             input_path=args.INPUT_PATH,
@@ -85,10 +310,13 @@ def main():
             model_name=args.MODEL,
             version_name=args.VERSION,
             result_content=result,
-            prompt_template=args.PROMPT
+            prompt_template=args.PROMPT,
+            postprocessor=make_postprocessor(args)
         )
         print("\nMigração concluída com sucesso!")
         print(f"Resultado salvo em: {saved_path}")
+        if client.last_stats:
+            print(format_stats(client.last_stats))
     except Exception as e:
         print(e)
 
@@ -0,0 +1,22 @@
+import importlib
+
+# Model backends by the name used on the command line. A backend's module
+# (and with it openai or ollama) is only imported when that name is asked
+# for, so a run against one backend never pays for the other.
+CLIENTS = {
+    "gpt": ("models.gpt_client", "GPTClient"),
+    "ollama": ("models.ollama_client", "OllamaClient"),
+}
+
+
+def client_names():
+    return sorted(CLIENTS)
+
+
+def get_client_class(model_name):
+    """Imports the backend registered under `model_name` and returns its client class."""
+    try:
+        module_name, class_name = CLIENTS[model_name]
+    except KeyError:
+        raise Exception(f"Unsupported model: {model_name}") from None
+    return getattr(importlib.import_module(module_name), class_name)
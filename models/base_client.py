@@ -1,11 +1,43 @@
-import re
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from models.generation_budget import GenerationTimeoutError
+from models.prompt_template import load_compiled_template
+from models.response_cache import make_cache_key
 
 
 class BaseClient:
+    model_family = None
+    async_client = None
+    # Optional models.response_cache.ResponseCache consulted before each request.
+    cache = None
+    # Optional models.metrics.MetricsRecorder receiving one entry per request.
+    metrics = None
+
+    def __init__(self, stream=False, stop_at_code_block=False):
+        # Cancelling at the end of the first code block needs the tokens as they arrive.
+        self.stream = stream or stop_at_code_block
+        self.stop_at_code_block = stop_at_code_block
+        self._local = threading.local()
+
+    @property
+    def last_stats(self):
+        """
+        Streaming stats (ttft, tokens/s, ...) of this thread's last request;
+        None when it was answered from the cache or not streamed.
+        """
+        return getattr(self._local, "stats", None)
+
+    @last_stats.setter
+    def last_stats(self, stats):
+        self._local.stats = stats
+
     def load_template(self, file_name):
-        path = f"models/templates/{file_name}.txt"
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
+        """Returns the compiled template, parsed once per process."""
+        return load_compiled_template(file_name)
 
     def get_input_code(self, file_path):
         try:
@@ -16,16 +48,141 @@ class BaseClient:
         except Exception as e:
             return f"ERROR: {e}"
 
-    def find_pattern(self, formatted, flag):
-        pattern = rf"{{{flag}}}(.*?)[\r\n]*{{{flag}_END}}"
-        matches = re.findall(pattern, formatted, re.DOTALL)
-        return matches
+    def generate_prompt(self, template, **kwargs):
+        """Renders a compiled template into the list of chat messages."""
+        return template.render(**kwargs)
+
+    def build_prompt(self, args, input_code=None):
+        if input_code is None:
+            input_code = self.get_input_code(file_path=args.INPUT_PATH)
+        template = self.load_template(file_name=args.PROMPT)
+        return self.generate_prompt(
+            template=template,
+            PROMPT=args.PROMPT,
+            LANGUAGE_NAME=args.LANGUAGE_NAME,
+            OLD_LIB_NAME=args.OLD_LIB_NAME,
+            NEW_LIB_NAME=args.NEW_LIB_NAME,
+            CODE_BEFORE_MIGRATION=input_code,
+        )
 
-    def generate_request_dict(self, role, content):
-        return {"role": role, "content": content}
+    def sampling_options(self):
+        """Options sent with every request; part of the response cache key."""
+        return {}
 
-    def generate_prompt(self, template, **kwargs):
+    def cached_response(self, args, prompt, options=None):
+        """
+        Returns (cache key, cached response or None). `options` are the
+        request's own options when they depend on the prompt; by default
+        sampling_options() is used.
+        """
+        if self.cache is None:
+            return None, None
+        if options is None:
+            options = self.sampling_options()
+        if self.stop_at_code_block:
+            # Truncated completions must not be served to full-length requests.
+            options = {**options, "stop_at_code_block": True}
+        key = make_cache_key(self.model_family, args.VERSION, prompt, options)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.record_request(args, latency=0.0, cached=True)
+        return key, cached
+
+    def store_response(self, key, response):
+        if self.cache is not None and key is not None:
+            self.cache.put(key, response)
+
+    # --- Metrics ---
+
+    def record_request(self, args, **fields):
+        if self.metrics is None:
+            return None
+        return self.metrics.record({
+            "model_family": self.model_family,
+            "model": args.VERSION,
+            "prompt": args.PROMPT,
+            "input": os.path.basename(args.INPUT_PATH) if getattr(args, "INPUT_PATH", None) else None,
+            **fields,
+        })
+
+    @contextmanager
+    def measure_request(self, args):
+        """
+        Times the request made inside the block and records it on exit, with
+        whatever usage the block stored in the yielded dict (see
+        models.metrics.ollama_usage/openai_usage), or with the error raised.
+        Extra entry fields can be put under the dict's 'fields' key.
+        """
+        request = {}
+        started = time.perf_counter()
         try:
-            return template.format(**kwargs)
-        except KeyError as e:
-            raise ValueError(f"Missing template variable: {e}")
+            yield request
+        except BaseException as e:
+            self.record_request(args, latency=time.perf_counter() - started, cached=False,
+                                error=f"{type(e).__name__}: {e}", **(request.get("fields") or {}))
+            raise
+        stats = request.pop("stats", None) or {}
+        self.record_request(
+            args,
+            latency=time.perf_counter() - started,
+            cached=False,
+            ttft=stats.get("ttft"),
+            stopped_early=stats.get("stopped_early", False),
+            **(request.get("fields") or {}),
+            **(request.get("usage") or stats.get("usage") or {}),
+        )
+
+    # --- Async layer ---
+
+    def open_async_client(self, timeout=None):
+        """Creates the backend's async client. Subclasses must override it."""
+        raise NotImplementedError
+
+    async def close_async_client(self):
+        self.async_client = None
+
+    async def prepare_async(self, jobs):
+        """Hook run once before a fan-out, e.g. to make sure models are available."""
+
+    async def aprocess(self, args, input_code=None):
+        raise NotImplementedError
+
+    async def aprocess_many(self, jobs, concurrency=4, timeout=None, on_result=None):
+        """
+        Runs a list of (args, input_code) jobs with at most `concurrency`
+        requests in flight. Each request is cancelled after `timeout` seconds.
+
+        Results keep the order of `jobs`; a failed job yields its exception
+        instead of a string. `on_result(index, result)` is called in a worker
+        thread as soon as each job finishes, so results can be saved before
+        the whole fan-out is done.
+        """
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run(index, args, input_code):
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(self.aprocess(args, input_code=input_code), timeout)
+                except GenerationTimeoutError as e:
+                    result = e
+                except asyncio.TimeoutError:
+                    result = TimeoutError(f"Request timed out after {timeout}s")
+                except Exception as e:
+                    result = e
+            if on_result is not None:
+                await asyncio.to_thread(on_result, index, result)
+            return result
+
+        self.open_async_client(timeout=timeout)
+        try:
+            await self.prepare_async(jobs)
+            return await asyncio.gather(
+                *(run(index, args, input_code) for index, (args, input_code) in enumerate(jobs)),
+                return_exceptions=True,
+            )
+        finally:
+            await self.close_async_client()
+
+    def process_many(self, jobs, concurrency=4, timeout=None, on_result=None):
+        """Synchronous entry point for aprocess_many."""
+        return asyncio.run(self.aprocess_many(jobs, concurrency=concurrency, timeout=timeout, on_result=on_result))
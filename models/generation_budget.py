@@ -0,0 +1,82 @@
+import math
+
+# Per-request context window and generation limits for Ollama, sized from
+# the rendered prompt. Without them every request runs at the server's
+# default num_ctx (long inputs are cut silently, short ones reserve a KV
+# cache they never use) and with no bound on how long it may generate.
+
+# num_ctx values requests are rounded up to. Few distinct sizes let the
+# server keep reusing a loaded context instead of reallocating it.
+CONTEXT_BUCKETS = (2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+# No tokenizer is available client-side: code and prose average 3-4
+# characters per token, so 3 errs towards a larger context.
+CHARS_PER_TOKEN = 3.0
+# Role markers and separators the chat template adds to each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# The migrated file is about as long as the prompt's code; the ratio leaves
+# room for explanations and <think> sections.
+PREDICT_RATIO = 2.0
+MIN_PREDICT = 1024
+# Below this many tokens left for the answer, the request is not worth sending.
+MIN_OUTPUT_TOKENS = 256
+
+# Wall-clock cap: model load and prompt evaluation, plus generating
+# num_predict tokens at a pessimistic rate. Rounded up to whole steps.
+BASE_SECONDS = 60
+MIN_TOKENS_PER_SECOND = 5
+TIMEOUT_STEP_SECONDS = 30
+
+
+class ContextOverflowError(Exception):
+    """The prompt does not leave room for an answer in the model's context window."""
+
+
+class GenerationTimeoutError(TimeoutError):
+    """A request ran past the wall-clock cap of its plan."""
+
+
+def estimate_tokens(messages):
+    """Rough token count of a list of chat messages."""
+    characters = sum(len(message.get("content") or "") for message in messages)
+    return math.ceil(characters / CHARS_PER_TOKEN) + MESSAGE_OVERHEAD_TOKENS * len(messages)
+
+
+def context_bucket(tokens, limit=None):
+    """Smallest bucket holding `tokens`, never above `limit` (the model's context length)."""
+    for bucket in CONTEXT_BUCKETS:
+        if limit is not None and bucket >= limit:
+            return limit
+        if bucket >= tokens:
+            return bucket
+    return limit if limit is not None else CONTEXT_BUCKETS[-1]
+
+
+def wall_clock_limit(num_predict):
+    seconds = BASE_SECONDS + num_predict / MIN_TOKENS_PER_SECOND
+    return math.ceil(seconds / TIMEOUT_STEP_SECONDS) * TIMEOUT_STEP_SECONDS
+
+
+def plan_generation(prompt_tokens, context_limit=None):
+    """
+    Returns {'prompt_tokens', 'num_ctx', 'num_predict', 'timeout'} for a
+    prompt of `prompt_tokens`, or raises ContextOverflowError when not even
+    MIN_OUTPUT_TOKENS fit after it in `context_limit` (None: no known limit).
+    """
+    limit = context_limit or CONTEXT_BUCKETS[-1]
+    room = limit - prompt_tokens
+    if room < MIN_OUTPUT_TOKENS:
+        raise ContextOverflowError(
+            f"Prompt needs about {prompt_tokens} tokens; with {MIN_OUTPUT_TOKENS} for the answer "
+            f"it does not fit the model's context of {limit} tokens."
+        )
+    wanted = max(MIN_PREDICT, math.ceil(prompt_tokens * PREDICT_RATIO))
+    num_ctx = context_bucket(prompt_tokens + wanted, limit)
+    num_predict = min(wanted, num_ctx - prompt_tokens)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "num_ctx": num_ctx,
+        "num_predict": num_predict,
+        "timeout": wall_clock_limit(num_predict),
+    }
@@ -1,52 +1,158 @@
+import json
 import os
-import re
+import time
 
-from openai import OpenAI
-from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
 
 from models.base_client import BaseClient
+from models.metrics import openai_usage
+from models.streaming import aconsume_stream, consume_stream
 
-load_dotenv()
+# OpenAI Batch API: requests go in as one JSONL file and come back within the completion window.
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+FINAL_BATCH_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+_environment_loaded = False
+
+
+def load_environment():
+    """Reads .env into os.environ once, when the first client is created rather than at import."""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _environment_loaded = True
 
 
 class GPTClient(BaseClient):
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    model_family = "gpt"
 
-    def generate_prompt(self, template, **kwargs):
-        formatted = template.format(**kwargs)
-        system_match = self.find_pattern(formatted, "SYSTEM_CONFIG")
-        user_match = self.find_pattern(formatted, "USER_CONFIG")
+    def __init__(self, **options):
+        super().__init__(**options)
+        load_environment()
+        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-        system_config = self.generate_request_dict("system", system_match[0])
-        user_config_1 = self.generate_request_dict("user", user_match[0])
+    @staticmethod
+    def chunk_content(chunk):
+        return chunk.choices[0].delta.content if chunk.choices else None
 
-        if kwargs["PROMPT"] != "one_shot":
-            return [system_config, user_config_1]
+    def process(self, args, input_code=None):
+        self.last_stats = None
+        try:
+            prompt = self.build_prompt(args, input_code=input_code)
+            cache_key, cached = self.cached_response(args, prompt)
+            if cached is not None:
+                return cached
 
-        assistant_match = self.find_pattern(formatted, "ASSISTANT_CONFIG")
-        assistant_config = self.generate_request_dict("assistant", assistant_match[0])
+            with self.measure_request(args) as request:
+                if self.stream:
+                    chunks = self.client.chat.completions.create(
+                        model=args.VERSION, messages=prompt, stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    content, self.last_stats = consume_stream(
+                        chunks, self.chunk_content, self.stop_at_code_block, usage=openai_usage
+                    )
+                    request["stats"] = self.last_stats
+                else:
+                    response = self.client.chat.completions.create(
+                        model=args.VERSION, messages=prompt
+                    )
+                    content = response.choices[0].message.content
+                    request["usage"] = openai_usage(response)
+            self.store_response(cache_key, content)
+            return content
+        except ValueError as e:
+            return f"{self.__class__.__name__} could not generate a response: {e}"
 
-        user_config_2 = self.generate_request_dict("user", user_match[1])
+    def open_async_client(self, timeout=None):
+        self.async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=timeout)
 
-        return [system_config, user_config_1, assistant_config, user_config_2]
+    async def close_async_client(self):
+        await self.async_client.close()
+        self.async_client = None
 
-    def process(self, args):
+    async def aprocess(self, args, input_code=None):
+        self.last_stats = None
         try:
-            input_code = self.get_input_code(file_path=args.INPUT_PATH)
-            template = self.load_template(file_name=args.PROMPT)
-            prompt = self.generate_prompt(
-                template=template,
-                PROMPT=args.PROMPT,
-                LANGUAGE_NAME=args.LANGUAGE_NAME,
-                OLD_LIB_NAME=args.OLD_LIB_NAME,
-                NEW_LIB_NAME=args.NEW_LIB_NAME,
-                CODE_BEFORE_MIGRATION=input_code,
-            )
-
-            response = self.client.chat.completions.create(
-                model=args.VERSION, messages=prompt
-            )
-            return response.choices[0].message.content
+            prompt = self.build_prompt(args, input_code=input_code)
+            cache_key, cached = self.cached_response(args, prompt)
+            if cached is not None:
+                return cached
+
+            with self.measure_request(args) as request:
+                if self.stream:
+                    chunks = await self.async_client.chat.completions.create(
+                        model=args.VERSION, messages=prompt, stream=True,
+                        stream_options={"include_usage": True}
+                    )
+                    content, self.last_stats = await aconsume_stream(
+                        chunks, self.chunk_content, self.stop_at_code_block, usage=openai_usage
+                    )
+                    request["stats"] = self.last_stats
+                else:
+                    response = await self.async_client.chat.completions.create(
+                        model=args.VERSION, messages=prompt
+                    )
+                    content = response.choices[0].message.content
+                    request["usage"] = openai_usage(response)
+            self.store_response(cache_key, content)
+            return content
         except ValueError as e:
             return f"{self.__class__.__name__} could not generate a response: {e}"
+
+    # --- Batch API ---
+
+    def batch_request(self, custom_id, args, prompt):
+        """One line of a batch input file: the chat request process() would send for `prompt`."""
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": args.VERSION, "messages": prompt, **self.sampling_options()},
+        }
+
+    def submit_batch(self, requests, metadata=None):
+        """Uploads the requests as a JSONL file and creates a batch for it; returns the Batch."""
+        data = "".join(json.dumps(request) + "\n" for request in requests).encode("utf-8")
+        batch_file = self.client.files.create(file=("batch.jsonl", data), purpose="batch")
+        return self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=BATCH_COMPLETION_WINDOW,
+            metadata=metadata,
+        )
+
+    def wait_for_batch(self, batch_id, poll_interval=30.0, on_poll=None):
+        """Polls the batch until it reaches a final state; `on_poll` receives every Batch seen."""
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if on_poll is not None:
+                on_poll(batch)
+            if batch.status in FINAL_BATCH_STATES:
+                return batch
+            time.sleep(poll_interval)
+
+    def batch_results(self, batch):
+        """
+        Maps each custom_id of a finished batch to its completion text, or
+        to an Exception for requests that failed.
+        """
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry.get("response") or {}
+                if entry.get("error") or response.get("status_code") != 200:
+                    error = entry.get("error") or response.get("body", {}).get("error")
+                    results[entry["custom_id"]] = Exception(f"Batch request failed: {error}")
+                else:
+                    results[entry["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+        return results
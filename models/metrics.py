@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+# Per-request metrics of the model clients. Every request becomes one flat
+# dict, appended as a JSON line to a trace file and kept for the run summary.
+
+TRACE_NAME = ".trace.jsonl"
+# Ollama reports a few milliseconds of load_duration for a model that is
+# already in memory; anything above this means the model had to be loaded.
+COLD_LOAD_SECONDS = 0.5
+
+NANOSECONDS = 1e9
+
+
+def ollama_usage(response):
+    """Token counts and durations (in seconds) of an Ollama chat response or final stream chunk."""
+    if response is None or not getattr(response, "done", True):
+        return None
+
+    def seconds(name):
+        value = getattr(response, name, None)
+        return None if value is None else value / NANOSECONDS
+
+    return {
+        "prompt_tokens": getattr(response, "prompt_eval_count", None),
+        "completion_tokens": getattr(response, "eval_count", None),
+        "load_duration": seconds("load_duration"),
+        "prompt_eval_duration": seconds("prompt_eval_duration"),
+        "eval_duration": seconds("eval_duration"),
+        "total_duration": seconds("total_duration"),
+    }
+
+
+def openai_usage(response):
+    """Token counts of an OpenAI chat completion, or of a stream chunk carrying `usage`."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+    }
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers, or None when it is empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class MetricsRecorder:
+    """
+    Collects request metrics from any number of threads. With a trace path,
+    each entry is also appended to that JSONL file as it is recorded, tagged
+    with this recorder's run id.
+    """
+
+    def __init__(self, trace_path=None, run_id=None):
+        self.trace_path = trace_path
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.entries = []
+        self._lock = threading.Lock()
+        if trace_path:
+            directory = os.path.dirname(trace_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    def record(self, entry):
+        entry = {"run_id": self.run_id, "timestamp": time.time(), **entry}
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self.entries.append(entry)
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as trace:
+                    trace.write(line)
+        return entry
+
+    def summary(self):
+        return summarize(self.entries)
+
+
+def read_trace(trace_path, run_id=None):
+    """Entries of a trace file, optionally only those of one run."""
+    entries = []
+    try:
+        with open(trace_path, "r", encoding="utf-8") as trace:
+            for line in trace:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if run_id is None or entry.get("run_id") == run_id:
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def summarize(entries):
+    """Aggregates request entries: latency percentiles, token throughput, cold loads, cache hits, errors."""
+    requests = [e for e in entries if not e.get("cached") and not e.get("error")]
+    latencies = [e["latency"] for e in requests]
+    completion_tokens = [e["completion_tokens"] for e in requests if e.get("completion_tokens")]
+    # Prefer the server's own generation time; fall back to the wall time of the request.
+    generation_time = sum(
+        e.get("eval_duration") or e["latency"] for e in requests if e.get("completion_tokens")
+    )
+    return {
+        "requests": len(entries),
+        "cache_hits": sum(1 for e in entries if e.get("cached")),
+        "errors": sum(1 for e in entries if e.get("error")),
+        "p50_latency": percentile(latencies, 50),
+        "p95_latency": percentile(latencies, 95),
+        "max_latency": max(latencies) if latencies else None,
+        "prompt_tokens": sum(e.get("prompt_tokens") or 0 for e in requests),
+        "completion_tokens": sum(completion_tokens),
+        "tokens_per_second": (sum(completion_tokens) / generation_time) if generation_time else None,
+        "cold_loads": sum(1 for e in requests if (e.get("load_duration") or 0) > COLD_LOAD_SECONDS),
+        "load_time": sum(e.get("load_duration") or 0 for e in requests),
+    }
+
+
+def format_summary(summary):
+    def seconds(value):
+        return "-" if value is None else f"{value:.2f}s"
+
+    rate = "-" if summary["tokens_per_second"] is None else f"{summary['tokens_per_second']:.1f}"
+    return "\n".join([
+        f"Requests: {summary['requests']} ({summary['cache_hits']} cache hit(s), {summary['errors']} error(s))",
+        f"Latency: p50 {seconds(summary['p50_latency'])}, p95 {seconds(summary['p95_latency'])}, "
+        f"max {seconds(summary['max_latency'])}",
+        f"Tokens: {summary['prompt_tokens']} prompt, {summary['completion_tokens']} completion ({rate} tokens/s)",
+        f"Model loads: {summary['cold_loads']} cold load(s), {summary['load_time']:.2f}s loading in total",
+    ])
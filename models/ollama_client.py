@@ -1,12 +1,146 @@
+import asyncio
+import threading
+import time
+
+import httpx
 import ollama
-import requests
 
 from models.base_client import BaseClient
+from models.generation_budget import GenerationTimeoutError, estimate_tokens, plan_generation
+from models.metrics import ollama_usage
+from models.streaming import aconsume_stream, consume_stream
+
+
+def normalize_model_name(name):
+    return name if ":" in name else f"{name}:latest"
 
 
 class OllamaClient(BaseClient):
-    def __init__(self):
+    model_family = "ollama"
+
+    # Models known to be present on the Ollama server, shared by every
+    # client in the process so the server is only asked once.
+    _local_models = None
+    _models_lock = threading.Lock()
+    # Context length of each model as reported by the server (None if unknown)
+    _context_lengths = {}
+
+    def __init__(self, pull=True, keep_alive=None, budget=True, max_context=None, **options):
+        super().__init__(**options)
         self.client = ollama
+        self.pull = pull
+        # How long the server keeps the model loaded after a request; None uses its default.
+        self.keep_alive = keep_alive
+        # Size num_ctx/num_predict and a wall-clock cap from each prompt (see models.generation_budget)
+        self.budget = budget
+        # Upper bound on num_ctx, on top of the model's own context length
+        self.max_context = max_context
+        # Synchronous clients by timeout, so the wall-clock cap applies to non-streamed requests too
+        self._timed_clients = {}
+
+    def refresh_local_models(self):
+        response = self.client.list()
+        OllamaClient._local_models = {normalize_model_name(m.model) for m in response.models}
+        return OllamaClient._local_models
+
+    def ensure_model(self, version):
+        """
+        Makes sure `version` is available locally. The local model list is
+        fetched once per process; the model is only pulled on a miss, and
+        never when pulling is disabled.
+        """
+        name = normalize_model_name(version)
+        with OllamaClient._models_lock:
+            if OllamaClient._local_models is None:
+                self.refresh_local_models()
+            if name in OllamaClient._local_models:
+                return
+            if not self.pull:
+                raise Exception(f"Model {version} is not available locally and pulling is disabled.")
+            self.client.pull(version)
+            print(f"Pulled model {version}")
+            OllamaClient._local_models.add(name)
+
+    def loaded_models(self):
+        """Models the server currently holds in memory."""
+        return {normalize_model_name(m.model) for m in self.client.ps().models}
+
+    def unload_model(self, version):
+        """Asks the server to free the model right away (an empty request with keep_alive=0)."""
+        self.client.generate(model=version, keep_alive=0)
+
+    def context_length(self, version):
+        """
+        The model's maximum context from its metadata, asked once per process;
+        None if unknown. The model is made available first, so a model that
+        still has to be pulled is not mistaken for one without a known limit.
+        """
+        name = normalize_model_name(version)
+        if name not in OllamaClient._context_lengths:
+            self.ensure_model(version)
+            try:
+                info = self.client.show(version).modelinfo or {}
+            except ollama.ResponseError:
+                # Not remembered: the next request asks again rather than planning without a limit for good.
+                return None
+            OllamaClient._context_lengths[name] = next(
+                (v for k, v in info.items() if k.endswith(".context_length")), None
+            )
+        return OllamaClient._context_lengths[name]
+
+    def plan_request(self, args, prompt, model_limit=True):
+        """
+        num_ctx, num_predict and timeout for this prompt, or None with the
+        budget disabled. Raises ContextOverflowError when the prompt leaves
+        no room for an answer, before anything is sent. With model_limit
+        False the model's own context length is left out, so nothing is
+        asked of the server.
+        """
+        if not self.budget:
+            return None
+        model_context = self.context_length(args.VERSION) if model_limit else None
+        limits = [limit for limit in (model_context, self.max_context) if limit]
+        return plan_generation(estimate_tokens(prompt), min(limits) if limits else None)
+
+    def cache_options(self, args, prompt):
+        """
+        Options a response is cached under: the plan without the model's
+        context length. That length follows from args.VERSION, which is part
+        of the key already, so a cached rerun never has to reach the server.
+        """
+        return self.request_options(self.plan_request(args, prompt, model_limit=False))
+
+    def request_options(self, plan):
+        if plan is None:
+            return None
+        return {"num_ctx": plan["num_ctx"], "num_predict": plan["num_predict"]}
+
+    def connection_settings(self):
+        """
+        Host and headers of self.client (the ollama module's default client
+        unless replaced), so the clients built next to it talk to the same server.
+        """
+        base = self.client if isinstance(self.client, ollama.Client) else ollama._client
+        return {"host": str(base._client.base_url), "headers": dict(base._client.headers)}
+
+    def chat_client(self, plan):
+        if plan is None:
+            return self.client
+        timeout = plan["timeout"]
+        client = self._timed_clients.get(timeout)
+        if client is None:
+            client = self._timed_clients.setdefault(
+                timeout, ollama.Client(timeout=timeout, **self.connection_settings())
+            )
+        return client
+
+    @staticmethod
+    def budget_fields(plan):
+        """What the trace records about the request's budget."""
+        if plan is None:
+            return {}
+        return {"estimated_prompt_tokens": plan["prompt_tokens"], "num_ctx": plan["num_ctx"],
+                "num_predict": plan["num_predict"]}
 
     def start_ollama():
         """Starts the Ollama server as a background process."""
@@ -23,45 +157,112 @@ class OllamaClient(BaseClient):
             return process
 
     def is_ollama_running(self):
+        import requests
+
         try:
             response = requests.get("http://localhost:11434")
             return response.status_code == 200 and "Ollama is running" in response.text
         except requests.ConnectionError:
             return False
 
-    def generate_prompt(self, template, **kwargs):
-        formatted = template.format(**kwargs)
-        system_match = self.find_pattern(formatted, "SYSTEM_CONFIG")
-        user_match = self.find_pattern(formatted, "USER_CONFIG")
+    @staticmethod
+    def chunk_content(chunk):
+        return chunk["message"]["content"]
 
-        system_config = self.generate_request_dict("system", system_match[0])
-        user_config_1 = self.generate_request_dict("user", user_match[0])
+    def process(self, args, input_code=None):
+        self.last_stats = None
+        try:
+            prompt = self.build_prompt(args, input_code=input_code)
+            cache_key, cached = self.cached_response(args, prompt, self.cache_options(args, prompt))
+            if cached is not None:
+                return cached
+            plan = self.plan_request(args, prompt)
+            options = self.request_options(plan)
 
-        if kwargs["PROMPT"] != "one_shot":
-            return [system_config, user_config_1]
+            self.ensure_model(args.VERSION)
+            client = self.chat_client(plan)
+            deadline = None if plan is None else time.perf_counter() + plan["timeout"]
+            with self.measure_request(args) as request:
+                request["fields"] = self.budget_fields(plan)
+                try:
+                    if self.stream:
+                        chunks = client.chat(
+                            model=args.VERSION, messages=prompt, stream=True, options=options,
+                            keep_alive=self.keep_alive
+                        )
+                        content, self.last_stats = consume_stream(
+                            chunks, self.chunk_content, self.stop_at_code_block, usage=ollama_usage,
+                            deadline=deadline
+                        )
+                        request["stats"] = self.last_stats
+                    else:
+                        response = client.chat(
+                            model=args.VERSION, messages=prompt, options=options, keep_alive=self.keep_alive
+                        )
+                        content = response["message"]["content"]
+                        request["usage"] = ollama_usage(response)
+                except (httpx.TimeoutException, TimeoutError):
+                    if plan is None:
+                        raise
+                    raise GenerationTimeoutError(f"Request exceeded its {plan['timeout']}s generation budget")
+            self.store_response(cache_key, content)
+            return content
+        except ValueError as e:
+            return f"{self.__class__.__name__} could not generate a response: {e}"
 
-        assistant_match = self.find_pattern(formatted, "ASSISTANT_CONFIG")
-        assistant_config = self.generate_request_dict("assistant", assistant_match[0])
+    def open_async_client(self, timeout=None):
+        # ollama.AsyncClient has no close(); it gets a transport we own and close ourselves.
+        self._async_transport = httpx.AsyncHTTPTransport()
+        self.async_client = ollama.AsyncClient(
+            timeout=timeout, transport=self._async_transport, **self.connection_settings()
+        )
 
-        user_config_2 = self.generate_request_dict("user", user_match[1])
+    async def close_async_client(self):
+        await self._async_transport.aclose()
+        self._async_transport = None
+        self.async_client = None
 
-        return [system_config, user_config_1, assistant_config, user_config_2]
+    async def prepare_async(self, jobs):
+        for version in sorted({args.VERSION for args, _ in jobs}):
+            self.ensure_model(version)
 
-    def process(self, args):
+    async def aprocess(self, args, input_code=None):
+        self.last_stats = None
         try:
-            input_code = self.get_input_code(file_path=args.INPUT_PATH)
-            template = self.load_template(file_name=args.PROMPT)
-            prompt = self.generate_prompt(
-                template=template,
-                PROMPT=args.PROMPT,
-                LANGUAGE_NAME=args.LANGUAGE_NAME,
-                OLD_LIB_NAME=args.OLD_LIB_NAME,
-                NEW_LIB_NAME=args.NEW_LIB_NAME,
-                CODE_BEFORE_MIGRATION=input_code,
-            )
-            self.client.pull(args.VERSION)
-            print(f"Pulled model {args.VERSION}")
-            response = self.client.chat(model=args.VERSION, messages=prompt)
-            return response["message"]["content"]
+            prompt = self.build_prompt(args, input_code=input_code)
+            cache_key, cached = self.cached_response(args, prompt, self.cache_options(args, prompt))
+            if cached is not None:
+                return cached
+            plan = self.plan_request(args, prompt)
+            options = self.request_options(plan)
+
+            async def chat():
+                if self.stream:
+                    chunks = await self.async_client.chat(
+                        model=args.VERSION, messages=prompt, stream=True, options=options,
+                        keep_alive=self.keep_alive
+                    )
+                    content, stats = await aconsume_stream(
+                        chunks, self.chunk_content, self.stop_at_code_block, usage=ollama_usage
+                    )
+                    return content, stats, None
+                response = await self.async_client.chat(
+                    model=args.VERSION, messages=prompt, options=options, keep_alive=self.keep_alive
+                )
+                return response["message"]["content"], None, ollama_usage(response)
+
+            with self.measure_request(args) as request:
+                request["fields"] = self.budget_fields(plan)
+                try:
+                    content, stats, usage = await asyncio.wait_for(chat(), None if plan is None else plan["timeout"])
+                except asyncio.TimeoutError:
+                    if plan is None:
+                        raise
+                    raise GenerationTimeoutError(f"Request exceeded its {plan['timeout']}s generation budget")
+                if stats is not None:
+                    self.last_stats = request["stats"] = stats
+                request["usage"] = usage
+            self.store_response(cache_key, content)
+            return content
         except ValueError as e:
             return f"{self.__class__.__name__} could not generate a response: {e}"
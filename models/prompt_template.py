@@ -0,0 +1,63 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from string import Formatter
+
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+
+SECTION_ROLES = {"SYSTEM": "system", "USER": "user", "ASSISTANT": "assistant"}
+SECTION_PATTERN = re.compile(
+    r"\{\{(SYSTEM|USER|ASSISTANT)_CONFIG\}\}(.*?)\{\{\1_CONFIG_END\}\}", re.DOTALL
+)
+
+
+class CompiledTemplate:
+    """
+    A prompt template split once into its SYSTEM/USER/ASSISTANT sections.
+    Each section is kept as literal chunks and placeholder slots, so
+    rendering a prompt is only slot substitution.
+    """
+
+    def __init__(self, name, text):
+        self.name = name
+        self.sections = []
+        for flag, body in SECTION_PATTERN.findall(text):
+            slots = [
+                (literal, field, conversion, spec)
+                for literal, field, spec, conversion in Formatter().parse(body)
+            ]
+            self.sections.append((SECTION_ROLES[flag], slots))
+        self.fields = {field for _, slots in self.sections for _, field, _, _ in slots if field}
+
+    def render_section(self, slots, values):
+        parts = []
+        for literal, field, conversion, spec in slots:
+            parts.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, spec or ""))
+        return "".join(parts).rstrip("\r\n")
+
+    def render(self, **kwargs):
+        """Returns the chat messages for this template, in file order."""
+        missing = self.fields - kwargs.keys()
+        if missing:
+            raise ValueError(f"Missing template variable: {', '.join(sorted(missing))}")
+        return [
+            {"role": role, "content": self.render_section(slots, kwargs)}
+            for role, slots in self.sections
+        ]
+
+
+@lru_cache(maxsize=None)
+def load_compiled_template(name):
+    path = TEMPLATES_DIR / f"{name}.txt"
+    with open(path, "r", encoding="utf-8") as f:
+        return CompiledTemplate(name, f.read())
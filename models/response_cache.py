@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = ".cache/responses.sqlite"
+DEFAULT_MAX_SIZE_MB = 512
+
+
+def make_cache_key(model_family, version, messages, options=None):
+    """Content address of a request: identical requests share the same key."""
+    payload = json.dumps(
+        {
+            "model": model_family,
+            "version": version,
+            "messages": messages,
+            "options": options or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Persistent SQLite cache of model responses. Once the stored responses
+    exceed `max_size_mb`, the least recently used entries are evicted.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+        self._conn.commit()
+        # Running size of the stored responses, counted once here so a put does not sum the
+        # whole table; writes by other processes sharing the file are seen on the next open.
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            replaced = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now),
+            )
+            self._total += size - (replaced[0] if replaced else 0)
+            if self._total > self.max_size:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC")
+        stale = []
+        for key, size in rows:
+            if self._total <= self.max_size:
+                break
+            stale.append((key,))
+            self._total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
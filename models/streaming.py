@@ -0,0 +1,204 @@
+import re
+import time
+
+FENCE = "```"
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+# Longest marker we search for; a marker split across chunks is at most this long.
+LOOKBEHIND = len(THINK_CLOSE)
+# Same as the (?:\w+)? after the opening fence in parser.py's original regex
+LANGUAGE_TAG = re.compile(r"\w*")
+
+
+class CodeBlockScanner:
+    """
+    Linear-time fence scanner fed in chunks, so every search runs in
+    str.find and text is never rescanned. Fences inside <think>...</think>
+    are ignored; a block left open at the end of the input still counts,
+    as generations are often cut short. Used by parser.py on whole files
+    and, through CodeBlockWatcher, on streamed completions.
+    """
+
+    def __init__(self):
+        self.blocks: list[str] = []
+        # Offset, in the whole input, just past the closing fence of each block
+        self.block_ends: list[int] = []
+        self.visible: list[str] = []
+        self.body: list[str] = []
+        self.state = "outside"
+        self.carry = ""
+        # Length of the input before `carry`
+        self.offset = 0
+
+    def feed(self, chunk: str, final: bool = False):
+        text = self.carry + chunk
+        # Up to `hold` the text is scanned; past it a marker may still be incomplete.
+        hold = len(text) if final else max(0, len(text) - LOOKBEHIND)
+        pos = 0
+        # Next <think> at or after `pos` (-1: none left); only searched again once `pos` has passed it.
+        think = None
+        while True:
+            if self.state == "think":
+                close = text.find(THINK_CLOSE, pos)
+                if close == -1:
+                    pos = max(pos, hold)
+                    break
+                self.state, pos = "outside", close + len(THINK_CLOSE)
+            elif self.state == "inside":
+                close = text.find(FENCE, pos)
+                if close == -1:
+                    end = max(pos, hold)
+                    self.body.append(text[pos:end])
+                    pos = end
+                    break
+                self.body.append(text[pos:close])
+                self.blocks.append("".join(self.body).strip())
+                self.block_ends.append(self.offset + close + len(FENCE))
+                self.body = []
+                self.state, pos = "outside", close + len(FENCE)
+            else:
+                fence = text.find(FENCE, pos)
+                if think is None or think != -1 and think < pos:
+                    think = text.find(THINK_OPEN, pos)
+                if think != -1 and (fence == -1 or think < fence):
+                    self.visible.append(text[pos:think])
+                    self.state, pos = "think", think + len(THINK_OPEN)
+                    continue
+                if fence == -1:
+                    end = max(pos, hold)
+                    self.visible.append(text[pos:end])
+                    pos = end
+                    break
+                tag_end = LANGUAGE_TAG.match(text, fence + len(FENCE)).end()
+                if tag_end == len(text) and not final:
+                    # The language tag may go on in the next chunk.
+                    self.visible.append(text[pos:fence])
+                    pos = fence
+                    break
+                self.visible.append(text[pos:fence])
+                self.state, pos = "inside", tag_end
+        self.carry = text[pos:]
+        self.offset += pos
+
+    def close(self) -> tuple[list[str], str]:
+        """Returns the stripped code blocks and the text outside <think> sections."""
+        self.feed("", final=True)
+        if self.state == "inside":
+            self.blocks.append("".join(self.body).strip())
+            self.state = "outside"
+        return self.blocks, "".join(self.visible)
+
+
+class CodeBlockWatcher:
+    """
+    Reports when the first fenced code block of a streamed completion has
+    been closed, with the same rules as CodeBlockScanner.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.scanner = CodeBlockScanner()
+
+    def feed(self, chunk):
+        """Appends a chunk; returns True once the first code block is closed."""
+        self.parts.append(chunk)
+        if self.end is None:
+            self.scanner.feed(chunk)
+        return self.end is not None
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def end(self):
+        """Index just past the closing fence, or None while the block is open."""
+        return self.scanner.block_ends[0] if self.scanner.block_ends else None
+
+
+class StreamCollector:
+    """
+    Accumulates streamed completion chunks and measures time to first token
+    and tokens per second (one chunk is counted as one token).
+    """
+
+    def __init__(self, stop_at_code_block=False):
+        self.watcher = CodeBlockWatcher() if stop_at_code_block else None
+        # Token counts and durations reported by the server, usually on the last chunk
+        self.usage = None
+        self.parts = []
+        self.tokens = 0
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.stopped_early = False
+
+    def feed(self, content):
+        """Returns True when generation can be cancelled."""
+        if not content:
+            return False
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+        self.parts.append(content)
+        if self.watcher is not None and self.watcher.feed(content):
+            self.stopped_early = True
+            return True
+        return False
+
+    @property
+    def content(self):
+        if self.stopped_early:
+            return self.watcher.text[:self.watcher.end]
+        return "".join(self.parts)
+
+    def stats(self):
+        finished = time.perf_counter()
+        ttft = None if self.first_token_at is None else self.first_token_at - self.started
+        generation_time = None if self.first_token_at is None else finished - self.first_token_at
+        return {
+            "ttft": ttft,
+            "duration": finished - self.started,
+            "tokens": self.tokens,
+            "tokens_per_second": (self.tokens / generation_time) if generation_time else None,
+            "stopped_early": self.stopped_early,
+            "usage": self.usage,
+        }
+
+
+def consume_stream(chunks, extract, stop_at_code_block=False, usage=None, deadline=None):
+    """
+    Reads a synchronous chunk iterator; returns (content, stats). `usage`
+    extracts the server's token counts from a chunk, when it has them.
+    Past `deadline` (a time.perf_counter() value) the stream is closed and
+    TimeoutError raised.
+    """
+    collector = StreamCollector(stop_at_code_block)
+    try:
+        for chunk in chunks:
+            if usage is not None:
+                collector.usage = usage(chunk) or collector.usage
+            if collector.feed(extract(chunk)):
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                raise TimeoutError(f"Generation still running after {deadline - collector.started:.0f}s")
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return collector.content, collector.stats()
+
+
+async def aconsume_stream(chunks, extract, stop_at_code_block=False, usage=None):
+    """Reads an asynchronous chunk iterator; returns (content, stats). See consume_stream."""
+    collector = StreamCollector(stop_at_code_block)
+    try:
+        async for chunk in chunks:
+            if usage is not None:
+                collector.usage = usage(chunk) or collector.usage
+            if collector.feed(extract(chunk)):
+                break
+    finally:
+        close = getattr(chunks, "aclose", None) or getattr(chunks, "close", None)
+        if close is not None:
+            await close()
+    return collector.content, collector.stats()
@@ -1,44 +1,125 @@
+import json
 import os
-import re
+from concurrent.futures import ProcessPoolExecutor
 
-# usage: python parser.py /path/to/your/folder --output codes
+from files import write_if_changed
+from models.streaming import CodeBlockScanner
+
+# usage: python parser.py /path/to/your/folder --output codes [--policy last] [--jobs 4]
 # where 'codes' is the output folder name
 
+POLICIES = ("first", "last", "longest", "all")
+DEFAULT_POLICY = "last"
+CHUNK_SIZE = 1 << 16
+# Policy of the last completed run into an output folder; outputs from another policy are never up to date.
+STATE_NAME = ".parser.json"
+
+
+def scan_code_blocks(chunks) -> tuple[list[str], str]:
+    """Runs a CodeBlockScanner over an iterable of text chunks."""
+    scanner = CodeBlockScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.close()
+
+
+def read_chunks(file, size: int = CHUNK_SIZE):
+    return iter(lambda: file.read(size), "")
+
+
 def extract_code_blocks(text: str) -> list[str]:
-    pattern = r"```(?:\w+)?\s*(.*?)```"
-    matches = re.findall(pattern, text, re.DOTALL)
-    return [m.strip() for m in matches] if matches else [text]
+    """All code blocks of `text`, or [text] when it has none."""
+    blocks, _ = scan_code_blocks([text])
+    return blocks if blocks else [text]
+
 
+def select_code(blocks: list[str], fallback: str, policy: str = DEFAULT_POLICY) -> str:
+    """Applies an extraction policy; without any block the visible text is kept as is."""
+    if not blocks:
+        return fallback
+    if policy == "first":
+        return blocks[0]
+    if policy == "last":
+        return blocks[-1]
+    if policy == "longest":
+        return max(blocks, key=len)
+    if policy == "all":
+        return "\n\n".join(blocks)
+    raise ValueError(f"Unknown extraction policy '{policy}'. Choose one of: {', '.join(POLICIES)}")
 
-def process_directory(input_dir: str, output_dir: str = "output"):
-    block_counter = 0
 
-    for root, _, files in os.walk(input_dir):
+def extract_code(text: str, policy: str = DEFAULT_POLICY) -> str:
+    blocks, visible = scan_code_blocks([text])
+    return select_code(blocks, visible, policy)
+
+
+def process_file(task) -> tuple[str, int]:
+    """
+    Worker: extracts the code of one file into its output file.
+    Returns (status, number of blocks found), status being one of
+    'written', 'unchanged' or 'skipped' (output newer than input, see STATE_NAME).
+    """
+    input_path, output_file, policy, force = task
+    if not force:
+        try:
+            if os.stat(output_file).st_mtime >= os.stat(input_path).st_mtime:
+                return "skipped", 0
+        except FileNotFoundError:
+            pass
+
+    with open(input_path, "r", encoding="utf-8") as f:
+        blocks, visible = scan_code_blocks(read_chunks(f))
+    code = select_code(blocks, visible, policy)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    return ("written" if write_if_changed(output_file, code) else "unchanged"), len(blocks)
+
+
+def list_tasks(input_dir: str, output_dir: str, policy: str, force: bool) -> list[tuple]:
+    tasks = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        relative_path = os.path.relpath(root, input_dir)
+        target_dir = os.path.join(output_dir, relative_path)
         for filename in files:
-            if filename:
-                input_path = os.path.join(root, filename)
+            if filename and not filename.startswith('.'):
+                output_file = os.path.join(target_dir, f"{os.path.splitext(filename)[0]}.txt")
+                tasks.append((os.path.join(root, filename), output_file, policy, force))
+    return tasks
+
+
+def read_policy(state_path: str):
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("policy")
+    except (OSError, ValueError, AttributeError):
+        return None
+
 
-                with open(input_path, "r", encoding="utf-8") as f:
-                    content = f.read()
+def process_directory(input_dir: str, output_dir: str = "output", policy: str = DEFAULT_POLICY,
+                      jobs: int = 1, force: bool = False):
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown extraction policy '{policy}'. Choose one of: {', '.join(POLICIES)}")
 
-                code_blocks = extract_code_blocks(content)
-                if not code_blocks:
-                    continue
+    state_path = os.path.join(output_dir, STATE_NAME)
+    if not force and read_policy(state_path) != policy:
+        force = True
 
-                relative_path = os.path.relpath(root, input_dir)
-                target_dir = os.path.join(output_dir, relative_path)
-                os.makedirs(target_dir, exist_ok=True)
+    tasks = list_tasks(input_dir, output_dir, policy, force)
+    if jobs > 1 and len(tasks) > 1:
+        chunksize = max(1, len(tasks) // (jobs * 4))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(process_file, tasks, chunksize=chunksize))
+    else:
+        results = [process_file(task) for task in tasks]
 
-                for i, block in enumerate(code_blocks, 1):
-                    block_counter += 1
-                    output_file = os.path.join(
-                        target_dir,
-                        f"{os.path.splitext(filename)[0]}.txt"
-                    )
-                    with open(output_file, "w", encoding="utf-8") as out:
-                        out.write(block)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"policy": policy}, f)
 
-    print(f"Extraction complete! {block_counter} blocks saved in '{output_dir}/'")
+    block_counter = sum(blocks for _, blocks in results)
+    statuses = [status for status, _ in results]
+    print(f"Extraction complete! {block_counter} blocks found; {statuses.count('written')} files written, "
+          f"{statuses.count('unchanged')} unchanged, {statuses.count('skipped')} up to date in '{output_dir}/'")
 
 
 if __name__ == "__main__":
@@ -47,6 +128,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Extract code blocks from .txt files, preserving folder structure")
     parser.add_argument("input_dir", help="Directory containing .txt files")
     parser.add_argument("--output", default="output", help="Output directory (default: output)")
+    parser.add_argument("--policy", choices=POLICIES, default=DEFAULT_POLICY,
+                        help=f"Which code block to keep when there are several (default: {DEFAULT_POLICY})")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-extract files whose output is newer than the input")
 
     args = parser.parse_args()
-    process_directory(args.input_dir, args.output)
+    process_directory(args.input_dir, args.output, policy=args.policy, jobs=args.jobs, force=args.force)
@@ -0,0 +1,91 @@
+import os
+import threading
+from pathlib import Path
+
+from files import split_attempt
+from parser import DEFAULT_POLICY, extract_code
+
+PARSED_DIRECTORY = "parsed"
+
+
+def strip_think(result_content):
+    """The completion as saved to output/: everything after </think>, if there is a <think> section."""
+    if '<think>' in result_content:
+        return result_content.split('</think>', 1)[-1].lstrip()
+    return result_content
+
+
+def parsed_path_for(saved_path, parsed_directory=PARSED_DIRECTORY):
+    """
+    Where parser.py would write the code of `saved_path` when run as
+    `parser.py output --output parsed`: same relative layout, '.txt' name.
+    """
+    relative = Path(saved_path).relative_to("output")
+    filename = f"{os.path.splitext(relative.name)[0]}.txt"
+    return Path(parsed_directory) / relative.parent / filename
+
+
+class PostProcessor:
+    """
+    In-pipeline replacement for the parser.py and get_codebleu_metric.py
+    passes: from the completion already in memory, writes the extracted
+    code to parsed/ and, when a score store is given, scores it against the
+    reference. Each score is saved as soon as it is computed, under the
+    same keys get_codebleu_metric.py uses, so its next run reuses them
+    instead of scoring again, even after an interrupted sweep.
+    """
+
+    def __init__(self, policy=DEFAULT_POLICY, parsed_directory=PARSED_DIRECTORY, score_store_file=None):
+        self.policy = policy
+        self.parsed_directory = parsed_directory
+        self.score_store_file = score_store_file
+        self.saved = 0
+        self._store = None
+        self._lock = threading.Lock()
+
+    def process(self, saved_path, result_content, migration=None):
+        """
+        Writes the parsed artefact of a saved completion and returns its path.
+        `migration` ({'migration_file', 'id', 'type', 'code_after'}) enables scoring.
+        """
+        code = extract_code(strip_think(result_content), self.policy)
+        parsed_path = parsed_path_for(saved_path, self.parsed_directory)
+        parsed_path.parent.mkdir(parents=True, exist_ok=True)
+        parsed_path.write_text(code, encoding="utf-8")
+
+        if self.score_store_file and migration is not None and migration.get('code_after'):
+            self._score(saved_path, code, migration)
+        return parsed_path
+
+    def _score(self, saved_path, code, migration):
+        from codebleu_engine import score_one
+        from score_store import ScoreStore, content_hash
+
+        # output/<language>/<family>/<version>/<prompt>/<repo>/<file>
+        _, language, family, version, prompt, repo, filename = Path(saved_path).parts[-7:]
+        if split_attempt(os.path.splitext(filename)[0])[1] != 0:
+            # get_codebleu_metric scores the first attempt ('name', not 'name(n)') under the
+            # same key; a repeat attempt's score would overwrite it.
+            return None
+        reference = migration['code_after']
+        with self._lock:
+            score = score_one(code, reference, language)
+            if self._store is None:
+                self._store = ScoreStore(self.score_store_file)
+            self._store.save_many([{
+                'model': f"{family}/{version}", 'method': f"{prompt}/{repo}",
+                'migration_file': migration['migration_file'], 'migration_id': migration['id'],
+                'migration_type': migration.get('type'),
+                'prediction_hash': content_hash(code), 'reference_hash': content_hash(reference),
+                'score': score,
+            }])
+            self.saved += 1
+        return score
+
+    def close(self):
+        """Closes the score store; returns how many scores were saved to it."""
+        with self._lock:
+            if self._store is not None:
+                self._store.close()
+                self._store = None
+            return self.saved
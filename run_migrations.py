@@ -1,15 +1,47 @@
 import argparse
-import csv
+import hashlib
+import json
 import subprocess
 import sys
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import os
 
-def run_all_migrations(csv_path, llm_name, prompt_template):
+from dataset import load_dataset
+from models.metrics import format_summary, read_trace, summarize
+from score_store import DEFAULT_SCORE_STORE
+from main import (
+    add_cache_arguments,
+    add_generation_arguments,
+    add_model_availability_arguments,
+    add_postprocess_arguments,
+    add_streaming_arguments,
+    add_trace_arguments,
+    attach_cache,
+    attach_metrics,
+    ensure_models,
+    format_stats,
+    generation_options,
+    get_client_by_model,
+    get_output_dir,
+    get_trace_path,
+    make_postprocessor,
+    save_result_to_file,
+    streaming_options,
+)
+
+LANGUAGE = "python"
+TEMPLATES = ['zero_shot', 'one_shot', 'chain_of_thoughts']
+# While a model's group of runs is in progress it stays loaded at least this long between requests.
+DEFAULT_KEEP_ALIVE = "30m"
+
+def run_all_migrations(csv_path, llm_name, prompt_template, extra_args=(), resume=False):
     """
     Reads a CSV file, creates a temporary file for the source code,
-    and runs the main.py script for each row.
+    and runs the main.py script for each row. `extra_args` are appended
+    to every main.py command line.
     """
     script_dir = Path(__file__).resolve().parent
     main_py_path = script_dir / "main.py"
@@ -21,75 +53,511 @@ def run_all_migrations(csv_path, llm_name, prompt_template):
     base_temp_dir.mkdir(exist_ok=True)
 
     try:
-        with open(csv_path, mode='r', newline='', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            migration_tasks = list(reader)
-            if not migration_tasks:
-                print("CSV file is empty. No migrations to run.")
-                return
-
-            total_tasks = len(migration_tasks)
-            print(f"Found {total_tasks} migration tasks in '{csv_path}'. Starting process...\n")
-
-            for i, row in enumerate(migration_tasks, 1):
-                with tempfile.TemporaryDirectory(dir=base_temp_dir) as temp_dir:
-                    try:
-                        temp_dir_path = Path(temp_dir)
-                        language = "python"
-                        old_lib = row['legacy_lib']
-                        repo_name = row['repo_name']
-                        filename = f"python_{row['legacy_lib']}_{row['target_lib']}" + row['id']
-                        source_code = row['code_before']
-                        
-                        temp_source_file = temp_dir_path / 'input' / language / prompt_template / old_lib / repo_name / filename
-
-                        parent_dir = temp_source_file.parent
-
-                        parent_dir.mkdir(parents=True, exist_ok=True)
-                                                
-                        temp_source_file.write_text(source_code, encoding='utf-8')
-
-                        print(f"--- [ {i}/{total_tasks} ] Running migration for: {repo_name}/{filename} ---")
-                        
-                        command = [
-                            sys.executable,
-                            str(main_py_path),
-                            language,
-                            old_lib,
-                            row['target_lib'],
-                            "ollama",
-                            llm_name,
-                            prompt_template,
-                            str(temp_source_file)
-                        ]
-
-                        result = subprocess.run(
-                            command, 
-                            check=True, 
-                            capture_output=True, 
-                            text=True, 
-                            encoding='utf-8'
-                        )
-
-                        print(result.stdout.strip())
-                        if result.stderr:
-                            print("STDERR:", result.stderr.strip())
-
-                    except KeyError as e:
-                        print(f"Error: CSV file is missing required column: {e}. Skipping this row.")
-                    except subprocess.CalledProcessError as e:
-                        print(f"An error occurred while executing main.py for row {i}.")
-                        print(f"   Return Code: {e.returncode}")
-                        print(f"   Output:\n{e.stdout.strip()}")
-                        print(f"   Error Output:\n{e.stderr.strip()}")
+        migration_tasks = load_migration_tasks(csv_path)
+        if not migration_tasks:
+            print("CSV file is empty. No migrations to run.")
+            return
+        if resume:
+            migration_tasks = pending_tasks(migration_tasks, "ollama", llm_name, prompt_template)
+
+        total_tasks = len(migration_tasks)
+        print(f"Found {total_tasks} migration tasks in '{csv_path}'. Starting process...\n")
+
+        for i, row in enumerate(migration_tasks, 1):
+            with tempfile.TemporaryDirectory(dir=base_temp_dir) as temp_dir:
+                try:
+                    temp_dir_path = Path(temp_dir)
+                    language = "python"
+                    old_lib = row['legacy_lib']
+                    repo_name = row['repo_name']
+                    filename = f"python_{row['legacy_lib']}_{row['target_lib']}" + row['id']
+                    source_code = row['code_before']
+                    
+                    temp_source_file = temp_dir_path / 'input' / language / prompt_template / old_lib / repo_name / filename
+
+                    parent_dir = temp_source_file.parent
+
+                    parent_dir.mkdir(parents=True, exist_ok=True)
+                                            
+                    temp_source_file.write_text(source_code, encoding='utf-8')
+
+                    print(f"--- [ {i}/{total_tasks} ] Running migration for: {repo_name}/{filename} ---")
                     
-                    print(f"Migration complete. Temporary files cleaned up. 🧹")
-                    print("-" * 60 + "\n")
+                    command = [
+                        sys.executable,
+                        str(main_py_path),
+                        language,
+                        old_lib,
+                        row['target_lib'],
+                        "ollama",
+                        llm_name,
+                        prompt_template,
+                        str(temp_source_file),
+                        *extra_args
+                    ]
+
+                    result = subprocess.run(
+                        command, 
+                        check=True, 
+                        capture_output=True, 
+                        text=True, 
+                        encoding='utf-8'
+                    )
+
+                    print(result.stdout.strip())
+                    if result.stderr:
+                        print("STDERR:", result.stderr.strip())
+
+                except KeyError as e:
+                    print(f"Error: CSV file is missing required column: {e}. Skipping this row.")
+                except subprocess.CalledProcessError as e:
+                    print(f"An error occurred while executing main.py for row {i}.")
+                    print(f"   Return Code: {e.returncode}")
+                    print(f"   Output:\n{e.stdout.strip()}")
+                    print(f"   Error Output:\n{e.stderr.strip()}")
+                
+                print(f"Migration complete. Temporary files cleaned up. 🧹")
+                print("-" * 60 + "\n")
+
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+
+def load_migration_tasks(csv_path):
+    """Rows of the dataset as dicts, under the normalised column names (see dataset.py)."""
+    return load_dataset(csv_path).rows()
+
+
+def build_migration_args(row, model_name, llm_name, prompt_template, input_path):
+    """
+    Builds the same namespace main.py would get from its command line,
+    so clients can be driven in-process.
+    """
+    return argparse.Namespace(
+        LANGUAGE_NAME=LANGUAGE,
+        OLD_LIB_NAME=row['legacy_lib'],
+        NEW_LIB_NAME=row['target_lib'],
+        MODEL=model_name,
+        VERSION=llm_name,
+        PROMPT=prompt_template,
+        INPUT_PATH=str(input_path),
+    )
+
+
+def virtual_input_path(row, prompt_template):
+    """
+    Returns the path the subprocess runner would have written the snippet to.
+    Nothing is written there; it only feeds save_result_to_file so the batch
+    runner keeps the exact same output layout.
+    """
+    script_dir = Path(__file__).resolve().parent
+    filename = f"python_{row['legacy_lib']}_{row['target_lib']}" + row['id']
+    return (
+        script_dir / "temp_output" / "batch" / 'input' / LANGUAGE / prompt_template
+        / row['legacy_lib'] / row['repo_name'] / filename
+    )
+
+
+def already_migrated(row, model_name, llm_name, prompt_template):
+    input_path = virtual_input_path(row, prompt_template)
+    output_dir = get_output_dir(input_path, LANGUAGE, model_name, llm_name, prompt_template)
+    return (output_dir / input_path.name).exists()
+
+
+def pending_tasks(migration_tasks, model_name, llm_name, prompt_template):
+    """Drops the rows that already have a result in output/."""
+    pending = [
+        row for row in migration_tasks
+        if not already_migrated(row, model_name, llm_name, prompt_template)
+    ]
+    skipped = len(migration_tasks) - len(pending)
+    if skipped:
+        print(f"Resuming '{prompt_template}': skipping {skipped} row(s) already present in output/.")
+    return pending
+
+
+def drop_oversized(client, migration_tasks, model_name, llm_name, prompt_template):
+    """
+    Reports up front the rows whose prompt would not fit the model's context
+    (see OllamaClient.plan_request) and returns the others.
+    """
+    if not hasattr(client, "plan_request") or not migration_tasks:
+        return migration_tasks
+    from models.generation_budget import ContextOverflowError
+
+    kept = []
+    for i, row in enumerate(migration_tasks, 1):
+        args = build_migration_args(row, model_name, llm_name, prompt_template,
+                                    virtual_input_path(row, prompt_template))
+        try:
+            client.plan_request(args, client.build_prompt(args, input_code=row['code_before']))
+        except ContextOverflowError as e:
+            print(f"Skipping row {i} (id {row.get('id')}): {e}")
+            continue
+        kept.append(row)
+    if len(kept) < len(migration_tasks):
+        print(f"{len(migration_tasks) - len(kept)} row(s) do not fit the context of {llm_name} "
+              f"with '{prompt_template}'.\n")
+    return kept
+
+
+def migration_reference(csv_path, row):
+    """What the postprocessor needs to score a row the way get_codebleu_metric.py does."""
+    return {
+        'migration_file': os.path.basename(csv_path),
+        'id': row['id'],
+        'type': row.get('type'),
+        'code_after': row.get('code_after'),
+    }
+
+
+def migrate_row(client, row, model_name, llm_name, prompt_template, postprocessor=None, csv_path=None):
+    input_path = virtual_input_path(row, prompt_template)
+    args = build_migration_args(row, model_name, llm_name, prompt_template, input_path)
+    result = client.process(args, input_code=row['code_before'])
+    saved_path = save_result_to_file(
+        input_path=args.INPUT_PATH,
+        language_name=args.LANGUAGE_NAME,
+        model_name=args.MODEL,
+        version_name=args.VERSION,
+        result_content=result,
+        prompt_template=args.PROMPT,
+        postprocessor=postprocessor,
+        migration=migration_reference(csv_path, row) if csv_path else None
+    )
+    return saved_path, client.last_stats
+
+
+def run_batch_migrations(csv_path, llm_name, prompt_template, model_name="ollama", jobs=4,
+                         client=None, migration_tasks=None, postprocessor=None):
+    """
+    In-process counterpart of run_all_migrations: a single client is built
+    for the whole run and the CSV rows are dispatched to a bounded pool of
+    worker threads, feeding 'code_before' straight into process().
+    """
+    try:
+        if migration_tasks is None:
+            migration_tasks = load_migration_tasks(csv_path)
+        if not migration_tasks:
+            print(f"No migrations to run for '{prompt_template}'.")
+            return
+
+        if client is None:
+            client = get_client_by_model(model_name)
+
+        total_tasks = len(migration_tasks)
+        print(f"Found {total_tasks} migration tasks in '{csv_path}'. "
+              f"Running '{prompt_template}' with {jobs} worker(s)...\n")
+
+        print_lock = threading.Lock()
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            futures = {
+                executor.submit(migrate_row, client, row, model_name, llm_name, prompt_template,
+                                postprocessor, csv_path): (i, row)
+                for i, row in enumerate(migration_tasks, 1)
+            }
+            for future in as_completed(futures):
+                i, row = futures[future]
+                done += 1
+                try:
+                    saved_path, stats = future.result()
+                    message = f"--- [ {done}/{total_tasks} ] Row {i} saved to: {saved_path}"
+                    if stats:
+                        message += f"\n    {format_stats(stats)}"
+                except KeyError as e:
+                    message = f"Error: CSV file is missing required column: {e}. Skipping row {i}."
+                except Exception as e:
+                    message = f"An error occurred while migrating row {i}: {e}"
+                with print_lock:
+                    print(message)
+
+        print("-" * 60 + "\n")
+
+    except Exception as e:
+        print(f"An unexpected error occurred: {e}")
+
+
+def run_async_migrations(csv_path, llm_name, prompt_template, model_name="ollama", jobs=4, timeout=None,
+                         client=None, migration_tasks=None, postprocessor=None):
+    """
+    Asyncio counterpart of run_batch_migrations: all rows are sent through the
+    client's async API with at most `jobs` requests in flight, each one
+    cancelled after `timeout` seconds.
+    """
+    try:
+        if migration_tasks is None:
+            migration_tasks = load_migration_tasks(csv_path)
+        if not migration_tasks:
+            print(f"No migrations to run for '{prompt_template}'.")
+            return
+
+        if client is None:
+            client = get_client_by_model(model_name)
+
+        total_tasks = len(migration_tasks)
+        print(f"Found {total_tasks} migration tasks in '{csv_path}'. "
+              f"Running '{prompt_template}' with up to {jobs} request(s) in flight...\n")
+
+        jobs_args = []
+        for row in migration_tasks:
+            input_path = virtual_input_path(row, prompt_template)
+            args = build_migration_args(row, model_name, llm_name, prompt_template, input_path)
+            jobs_args.append((args, row['code_before']))
+
+        print_lock = threading.Lock()
+        done = 0
+
+        def save(index, result):
+            # Runs as each request finishes, so an interrupted sweep keeps what it already generated.
+            nonlocal done
+            i, row, (args, _) = index + 1, migration_tasks[index], jobs_args[index]
+            if isinstance(result, BaseException):
+                message = f"An error occurred while migrating row {i}: {result}"
+            else:
+                try:
+                    saved_path = save_result_to_file(
+                        input_path=args.INPUT_PATH,
+                        language_name=args.LANGUAGE_NAME,
+                        model_name=args.MODEL,
+                        version_name=args.VERSION,
+                        result_content=result,
+                        prompt_template=args.PROMPT,
+                        postprocessor=postprocessor,
+                        migration=migration_reference(csv_path, row)
+                    )
+                    message = None
+                except Exception as e:
+                    message = f"An error occurred while saving row {i}: {e}"
+            with print_lock:
+                done += 1
+                print(message or f"--- [ {done}/{total_tasks} ] Row {i} saved to: {saved_path}")
+
+        client.process_many(jobs_args, concurrency=jobs, timeout=timeout, on_result=save)
+
+        print("-" * 60 + "\n")
 
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
 
 
+def batch_checkpoint_path(csv_path, model_name, llm_name, templates):
+    """
+    Checkpoint of a batch sweep, named after the sweep itself (dataset,
+    model, version and templates) rather than the requests still pending,
+    so every rerun of the sweep finds the batches it already submitted.
+    """
+    sweep = json.dumps([os.path.basename(csv_path), model_name, llm_name, sorted(templates)])
+    digest = hashlib.sha256(sweep.encode("utf-8")).hexdigest()[:16]
+    return Path("output") / LANGUAGE / model_name / llm_name / f".batch-{digest}.json"
+
+
+def write_checkpoint(path, checkpoint):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".tmp")
+    temp_path.write_text(json.dumps(checkpoint, indent=2), encoding="utf-8")
+    os.replace(temp_path, path)
+
+
+def run_batch_api_migrations(csv_path, llm_name, tasks_by_template, client, model_name="gpt",
+                             poll_interval=30.0, postprocessor=None):
+    """
+    Offline counterpart of run_batch_migrations for clients with a batch API
+    (GPTClient): every template x row request goes into one batch file,
+    which is submitted, polled until it finishes and then mapped back to
+    its rows by custom id. Progress is kept in a checkpoint under output/,
+    so an interrupted run resumes polling the same batch and only saves the
+    results it has not saved yet. Once that batch has ended, the requests
+    it did not answer (failed, expired or cancelled) go into a new batch.
+    Rows that already have a result in output/ are never requested again.
+    """
+    checkpoint_path = batch_checkpoint_path(csv_path, model_name, llm_name, tasks_by_template)
+    if checkpoint_path.exists():
+        checkpoint = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+    else:
+        checkpoint = {"batch_id": None, "batches": [], "saved": []}
+    saved = set(checkpoint["saved"])
+
+    def answered(custom_id, row, template):
+        return custom_id in saved or already_migrated(row, model_name, llm_name, template)
+
+    rows = {}
+    requests = []
+    total = 0
+    for template, tasks in tasks_by_template.items():
+        for row in tasks:
+            total += 1
+            custom_id = f"{template}/{row['id']}"
+            if answered(custom_id, row, template):
+                saved.add(custom_id)
+                continue
+            input_path = virtual_input_path(row, template)
+            args = build_migration_args(row, model_name, llm_name, template, input_path)
+            prompt = client.build_prompt(args, input_code=row['code_before'])
+            cache_key, cached = client.cached_response(args, prompt)
+            if cached is not None:
+                save_batch_result(args, row, csv_path, cached, postprocessor)
+                saved.add(custom_id)
+                continue
+            rows[custom_id] = (args, row, cache_key)
+            requests.append(client.batch_request(custom_id, args, prompt))
+    checkpoint["saved"] = sorted(saved)
+    write_checkpoint(checkpoint_path, checkpoint)
+    if not requests:
+        print(f"All {total} request(s) are saved.")
+        return
+
+    def report(batch):
+        counts = batch.request_counts
+        done = f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else ""
+        print(f"Batch {batch.id}: {batch.status}{done}")
+
+    def collect(batch_id):
+        """Waits for the batch to end and saves every result it has that is not saved yet."""
+        batch = client.wait_for_batch(batch_id, poll_interval=poll_interval, on_poll=report)
+        results = client.batch_results(batch)
+        try:
+            for custom_id, (args, row, cache_key) in rows.items():
+                if custom_id not in results or answered(custom_id, row, args.PROMPT):
+                    continue
+                result = results[custom_id]
+                if isinstance(result, BaseException):
+                    print(f"An error occurred while migrating {custom_id}: {result}")
+                    continue
+                client.store_response(cache_key, result)
+                saved_path = save_batch_result(args, row, csv_path, result, postprocessor)
+                saved.add(custom_id)
+                print(f"--- [ {len(saved)}/{total} ] {custom_id} saved to: {saved_path}")
+        finally:
+            checkpoint["saved"] = sorted(saved)
+            checkpoint["status"] = batch.status
+            write_checkpoint(checkpoint_path, checkpoint)
+
+    if checkpoint["batch_id"] is not None:
+        print(f"Resuming batch {checkpoint['batch_id']} from '{checkpoint_path}'.")
+        collect(checkpoint["batch_id"])
+
+    pending = [request for request in requests if request["custom_id"] not in saved]
+    if not pending:
+        print(f"All {total} request(s) are saved.")
+        return
+    # A first run submits everything; a resumed one resubmits what its last batch did not answer.
+    batch = client.submit_batch(pending, metadata={"csv": os.path.basename(csv_path), "model": llm_name})
+    checkpoint["batch_id"] = batch.id
+    checkpoint["batches"].append(batch.id)
+    checkpoint["status"] = batch.status
+    write_checkpoint(checkpoint_path, checkpoint)
+    print(f"Submitted batch {batch.id} with {len(pending)} request(s); checkpoint in '{checkpoint_path}'.")
+    collect(batch.id)
+
+    missing = total - len(saved)
+    if missing:
+        print(f"{missing} request(s) were not answered; rerun to submit them in a new batch.")
+    print("-" * 60 + "\n")
+
+
+def save_batch_result(args, row, csv_path, result, postprocessor=None):
+    return save_result_to_file(
+        input_path=args.INPUT_PATH,
+        language_name=args.LANGUAGE_NAME,
+        model_name=args.MODEL,
+        version_name=args.VERSION,
+        result_content=result,
+        prompt_template=args.PROMPT,
+        postprocessor=postprocessor,
+        migration=migration_reference(csv_path, row)
+    )
+
+
+def schedule_versions(client, versions):
+    """
+    Orders the model versions of a sweep. Each version is run as one group,
+    so every model is loaded once; models the server already holds in
+    memory go first, the others keep the order they were given in.
+    """
+    versions = list(dict.fromkeys(versions))
+    if not hasattr(client, "loaded_models"):
+        return versions
+    try:
+        loaded = client.loaded_models()
+    except Exception as e:
+        print(f"Could not list the loaded models ({e}); keeping the given order.")
+        return versions
+    from models.ollama_client import normalize_model_name
+
+    return sorted(versions, key=lambda version: normalize_model_name(version) not in loaded)
+
+
+def run_model_group(client, args, model_name, version, all_tasks=None, postprocessor=None):
+    """
+    Runs every template for one model version while the model stays loaded
+    (client.keep_alive), then unloads it on purpose so the next group starts
+    from a free GPU. Prints the group's metrics summary at the end.
+    """
+    attach_metrics(client, args, LANGUAGE, model_name, version)
+    print(f"=== {model_name}/{version} ===")
+    try:
+        if args.subprocess:
+            # Once the preflight has run, the per-row processes don't need to check again.
+            extra_args = ["--no-pull"] if args.no_pull or args.ensure_models else []
+            if args.cache:
+                extra_args += ["--cache", args.cache, "--cache-size", str(args.cache_size)]
+            if args.stream:
+                extra_args.append("--stream")
+            if args.stop_at_code_block:
+                extra_args.append("--stop-at-code-block")
+            if args.parse:
+                extra_args += ["--parse", args.parse]
+            if args.keep_alive is not None:
+                extra_args += ["--keep-alive", str(args.keep_alive)]
+            if args.no_budget:
+                extra_args.append("--no-budget")
+            if args.max_context:
+                extra_args += ["--max-context", str(args.max_context)]
+            extra_args += ["--no-trace"] if args.no_trace else ["--trace-run-id", client.metrics.run_id]
+            for template in TEMPLATES:
+                run_all_migrations(args.csv_file, version, template, extra_args=extra_args,
+                                   resume=args.resume)
+        elif args.batch:
+            # Rows already in output/ are skipped whether or not --resume is given.
+            tasks_by_template = {template: all_tasks for template in TEMPLATES}
+            run_batch_api_migrations(args.csv_file, version, tasks_by_template, client, model_name=model_name,
+                                     poll_interval=args.poll_interval, postprocessor=postprocessor)
+        else:
+            for template in TEMPLATES:
+                tasks = all_tasks
+                if args.resume:
+                    tasks = pending_tasks(all_tasks, model_name, version, template)
+                tasks = drop_oversized(client, tasks, model_name, version, template)
+                if args.use_async:
+                    run_async_migrations(args.csv_file, version, template, model_name=model_name,
+                                         jobs=args.jobs, timeout=args.timeout, client=client,
+                                         migration_tasks=tasks, postprocessor=postprocessor)
+                else:
+                    run_batch_migrations(args.csv_file, version, template, model_name=model_name,
+                                         jobs=args.jobs, client=client, migration_tasks=tasks,
+                                         postprocessor=postprocessor)
+    finally:
+        if hasattr(client, "unload_model") and not args.no_unload:
+            try:
+                client.unload_model(version)
+                print(f"Unloaded model {version}")
+            except Exception as e:
+                print(f"Could not unload model {version}: {e}")
+
+    if args.subprocess:
+        entries = [] if args.no_trace else read_trace(
+            get_trace_path(LANGUAGE, model_name, version), run_id=client.metrics.run_id
+        )
+    else:
+        entries = client.metrics.entries
+    if entries:
+        print(f"Run summary for {version}:")
+        print(format_summary(summarize(entries)))
+        print()
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Run multiple code migrations defined in a CSV file."
@@ -99,12 +567,99 @@ if __name__ == "__main__":
         help="Path to the CSV file containing migration parameters."
     )
     parser.add_argument(
-        "llm_name", 
-        help="Name of the LLM to be run."
+        "llm_name",
+        nargs="+",
+        help="Name of the LLM to be run. Several names run one after the other, each model loaded once."
+    )
+    parser.add_argument(
+        "--model",
+        default="ollama",
+        help="Model family used by the in-process runner (default: ollama)."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Maximum number of concurrent migrations (default: 4)."
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="Send requests through the clients' asyncio API instead of worker threads."
     )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Per-request timeout in seconds for --async (default: none)."
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Submit every request at once through the OpenAI Batch API (--model gpt) and save the results "
+             "when the batch is done. Interrupted runs resume from a checkpoint under output/, "
+             "and rows already in output/ are never requested again."
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between status checks of a --batch run (default: 30)."
+    )
+    parser.add_argument(
+        "--subprocess",
+        action="store_true",
+        help="Use the legacy runner, which launches main.py once per row."
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip rows that already have a result in output/."
+    )
+    add_model_availability_arguments(parser)
+    add_generation_arguments(parser)
+    add_cache_arguments(parser)
+    add_streaming_arguments(parser)
+    add_postprocess_arguments(parser)
+    add_trace_arguments(parser)
+    parser.add_argument(
+        "--score",
+        nargs="?",
+        const=DEFAULT_SCORE_STORE,
+        default=None,
+        help=f"Also score each parsed result against 'code_after' and save it to this score store, "
+             f"as get_codebleu_metric.py would (default path: {DEFAULT_SCORE_STORE}; implies --parse). "
+             f"Not available with --subprocess."
+    )
+    parser.add_argument(
+        "--no-unload",
+        action="store_true",
+        help="Leave each model loaded once its runs are done, instead of unloading it before the next one."
+    )
+    parser.set_defaults(keep_alive=DEFAULT_KEEP_ALIVE)
     args = parser.parse_args()
+    if args.batch and (args.subprocess or args.model != "gpt"):
+        parser.error("--batch needs --model gpt and the in-process runner.")
+
+    model_name = "ollama" if args.subprocess else args.model
+    client = get_client_by_model(model_name, pull=not args.no_pull, keep_alive=args.keep_alive,
+                                 **generation_options(args), **streaming_options(args))
+    attach_cache(client, args)
+    if args.ensure_models:
+        try:
+            ensure_models(client, args.llm_name)
+        except Exception as e:
+            print(f"Preflight failed: {e}")
+            sys.exit(1)
 
-    templates = ['zero_shot', 'one_shot', 'chain_of_thoughts']
+    postprocessor = None if args.subprocess else make_postprocessor(args, score_store_file=args.score)
+    all_tasks = None if args.subprocess else load_migration_tasks(args.csv_file)
+    versions = schedule_versions(client, args.llm_name)
+    if len(versions) > 1:
+        print(f"Model schedule: {' -> '.join(versions)}\n")
+    for version in versions:
+        run_model_group(client, args, model_name, version, all_tasks, postprocessor)
 
-    for template in templates:
-        run_all_migrations(args.csv_file, args.llm_name, template)
\ No newline at end of file
+    if postprocessor is not None and args.score:
+        print(f"Saved {postprocessor.close()} score(s) to '{args.score}'.")
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+DEFAULT_SCORE_STORE = "scores.sqlite"
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ScoreStore:
+    """
+    SQLite table of CodeBLEU scores, one row per (model, method, migration
+    file, migration id). A stored score is reused as long as the hashes of
+    the prediction and of the reference it was computed from still match.
+    Missing snippets are stored with a NULL score so reports can still
+    count them. The connection may be used from several threads as long
+    as the caller serializes them.
+    """
+
+    def __init__(self, path=DEFAULT_SCORE_STORE):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                model TEXT NOT NULL,
+                method TEXT NOT NULL,
+                migration_file TEXT NOT NULL,
+                migration_id TEXT NOT NULL,
+                migration_type TEXT,
+                prediction_hash TEXT,
+                reference_hash TEXT,
+                score REAL,
+                scored_at REAL NOT NULL,
+                PRIMARY KEY (model, method, migration_file, migration_id)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def lookup(self, model, method, migration_file, migration_id, prediction_hash, reference_hash):
+        """Returns the stored score if it was computed from the same inputs, else None."""
+        row = self._conn.execute(
+            "SELECT score FROM scores WHERE model = ? AND method = ? AND migration_file = ? "
+            "AND migration_id = ? AND prediction_hash = ? AND reference_hash = ?",
+            (model, method, migration_file, str(migration_id), prediction_hash, reference_hash),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def save_many(self, records):
+        """
+        Upserts records given as dicts with the keys model, method,
+        migration_file, migration_id, migration_type, prediction_hash,
+        reference_hash and score.
+        """
+        now = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO scores (model, method, migration_file, migration_id, migration_type, "
+            "prediction_hash, reference_hash, score, scored_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    r["model"], r["method"], r["migration_file"], str(r["migration_id"]), r["migration_type"],
+                    r["prediction_hash"], r["reference_hash"], r["score"], now,
+                )
+                for r in records
+            ],
+        )
+        self._conn.commit()
+
+    def load_results(self, model, migration_files=None, methods=None):
+        """Stored rows for `model`, in the format generate_summary_report expects."""
+        query = "SELECT migration_file, migration_type, migration_id, method, score FROM scores WHERE model = ?"
+        params = [model]
+        for column, values in (("migration_file", migration_files), ("method", methods)):
+            if values is not None:
+                query += f" AND {column} IN ({', '.join('?' for _ in values)})"
+                params.extend(values)
+        return [
+            {"migration_file": f, "migration_type": t, "id": i, "method": m, "score": s}
+            for f, t, i, m, s in self._conn.execute(query, params)
+        ]
+
+    def close(self):
+        self._conn.close()
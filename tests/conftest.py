@@ -0,0 +1,25 @@
+import os
+import sys
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_llm_server import FakeLLMServer  # noqa: E402
+
+
+@pytest.fixture
+def fake_server():
+    with FakeLLMServer() as server:
+        yield server
+
+
+def migration_args(version="fake-model", prompt="zero_shot", input_path="example.py"):
+    """The argparse namespace main.py would build for one migration."""
+    return types.SimpleNamespace(
+        LANGUAGE_NAME="python", OLD_LIB_NAME="requests", NEW_LIB_NAME="httpx",
+        MODEL="ollama", VERSION=version, PROMPT=prompt, INPUT_PATH=input_path,
+    )
@@ -0,0 +1,40 @@
+import ollama
+import pytest
+
+from conftest import migration_args
+from models.ollama_client import OllamaClient
+
+
+@pytest.fixture
+def client(fake_server, monkeypatch):
+    monkeypatch.setattr(OllamaClient, "_local_models", None)
+    client = OllamaClient(budget=False)
+    client.client = ollama.Client(host=fake_server.url)
+    return client
+
+
+def test_process_many_bounds_requests_in_flight(client, fake_server):
+    fake_server.latency = 0.1
+    jobs = [(migration_args(input_path=f"example{i}.py"), f"x = {i}\n") for i in range(8)]
+    finished = []
+
+    results = client.process_many(jobs, concurrency=3, on_result=lambda i, r: finished.append(i))
+
+    assert results == [fake_server.completion] * 8
+    assert fake_server.counts["chat"] == 8
+    assert fake_server.max_active_requests == 3
+    assert sorted(finished) == list(range(8))
+
+
+def test_process_many_times_out_slow_requests(client, fake_server):
+    fake_server.latency = 1.0
+    finished = {}
+
+    results = client.process_many(
+        [(migration_args(), "x = 1\n")] * 2, concurrency=2, timeout=0.2,
+        on_result=lambda i, r: finished.setdefault(i, r),
+    )
+
+    assert all(isinstance(result, TimeoutError) for result in results)
+    assert "timed out after 0.2s" in str(results[0])
+    assert set(finished) == {0, 1}
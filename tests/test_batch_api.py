@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import run_migrations
+from fake_llm_server import FakeLLMServer
+from models.gpt_client import GPTClient
+
+LLM_NAME = "fake-gpt"
+
+
+def dataset_row(row_id):
+    return {
+        "id": str(row_id), "legacy_lib": "requests", "target_lib": "httpx", "repo_name": "repo",
+        "code_before": f"import requests\nrequests.get('https://example.com/{row_id}')\n",
+        "code_after": "import httpx\n", "type": "call",
+    }
+
+
+@pytest.fixture
+def batch_env(tmp_path, monkeypatch):
+    """Runs in an empty directory, so output/ and the checkpoint start fresh."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    def run(server, rows):
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{server.url}/v1")
+        run_migrations.run_batch_api_migrations(
+            "input/python/test.csv", LLM_NAME, {"zero_shot": rows}, GPTClient(), poll_interval=0.01,
+        )
+        checkpoints = list(tmp_path.glob(f"output/python/gpt/{LLM_NAME}/.batch-*.json"))
+        assert len(checkpoints) == 1
+        return json.loads(checkpoints[0].read_text(encoding="utf-8"))
+
+    return run
+
+
+def saved_files(tmp_path):
+    return sorted(
+        path.name for path in tmp_path.glob(f"output/python/gpt/{LLM_NAME}/zero_shot/*/*")
+        if path.is_file() and not path.name.startswith(".")
+    )
+
+
+def test_batch_submits_once_and_saves_every_result(batch_env, tmp_path):
+    rows = [dataset_row(n) for n in range(1, 4)]
+    with FakeLLMServer() as server:
+        checkpoint = batch_env(server, rows)
+
+    assert server.counts["batch_create"] == 1
+    assert checkpoint["saved"] == [f"zero_shot/{n}" for n in range(1, 4)]
+    assert len(saved_files(tmp_path)) == 3
+
+
+def test_batch_resumes_the_checkpointed_batch(batch_env, tmp_path):
+    rows = [dataset_row(n) for n in range(1, 3)]
+    with FakeLLMServer() as server:
+        checkpoint = batch_env(server, rows)
+        # Forget the results, as if the first run had stopped before saving them.
+        checkpoint_path = next(tmp_path.glob(f"output/python/gpt/{LLM_NAME}/.batch-*.json"))
+        checkpoint_path.write_text(json.dumps({**checkpoint, "saved": []}), encoding="utf-8")
+        for path in tmp_path.glob(f"output/python/gpt/{LLM_NAME}/zero_shot/*/*"):
+            if path.is_file():
+                path.unlink()
+        resumed = batch_env(server, rows)
+
+    assert server.counts["batch_create"] == 1
+    assert resumed["batch_id"] == checkpoint["batch_id"]
+    assert resumed["saved"] == checkpoint["saved"]
+    assert len(saved_files(tmp_path)) == 2
+
+
+def test_batch_rerun_requests_and_saves_nothing_twice(batch_env, tmp_path):
+    rows = [dataset_row(n) for n in range(1, 4)]
+    with FakeLLMServer() as server:
+        first = batch_env(server, rows)
+        # --resume leaves out the rows in output/; the sweep still maps to the same checkpoint.
+        second = batch_env(server, rows[2:])
+        third = batch_env(server, rows)
+
+    assert server.counts["batch_create"] == 1
+    assert first["batch_id"] == second["batch_id"] == third["batch_id"]
+    assert len(saved_files(tmp_path)) == 3
+
+
+def test_batch_resubmits_failed_requests(batch_env, tmp_path):
+    rows = [dataset_row(n) for n in range(1, 4)]
+    with FakeLLMServer(failing_requests={"zero_shot/2"}) as server:
+        first = batch_env(server, rows)
+        assert first["saved"] == ["zero_shot/1", "zero_shot/3"]
+        assert len(saved_files(tmp_path)) == 2
+
+        second = batch_env(server, rows)
+
+    assert server.counts["batch_create"] == 2
+    assert second["batches"] == [first["batch_id"], second["batch_id"]]
+    assert second["saved"] == ["zero_shot/1", "zero_shot/2", "zero_shot/3"]
+    # Only the failed request went into the new batch; nothing was saved twice.
+    assert server.batches[second["batch_id"]]["request_counts"]["total"] == 1
+    assert len(saved_files(tmp_path)) == 3
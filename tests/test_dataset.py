@@ -0,0 +1,71 @@
+import csv
+import os
+
+import pytest
+
+import dataset
+from dataset import load_dataset
+
+
+def write_csv(path, rows, header=("id", "repo", "rmv_lib", "add_lib", "before", "after")):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+@pytest.fixture
+def fresh_process(monkeypatch):
+    """Forgets the datasets loaded in this process, as a new process would."""
+    monkeypatch.setattr(dataset, "_loaded_datasets", {})
+    return lambda: dataset._loaded_datasets.clear()
+
+
+def test_columns_are_renamed_and_indexed(tmp_path, fresh_process):
+    csv_path = tmp_path / "data.csv"
+    write_csv(csv_path, [
+        ("7", "repo-a", "requests", "httpx", "old 7", "new 7"),
+        ("9", "repo-b", "requests", "aiohttp", "old 9", "new 9"),
+    ])
+
+    data = load_dataset(str(csv_path), cache_dir=str(tmp_path / "cache"))
+
+    assert len(data) == 2
+    assert data[0]["code_before"] == "old 7" and data[0]["target_lib"] == "httpx"
+    assert data.get(9)["repo_name"] == "repo-b"
+    assert [row["id"] for row in data.where("lib_pair", ("requests", "httpx"))] == ["7"]
+
+
+def test_rows_without_an_id_are_numbered(tmp_path, fresh_process):
+    csv_path = tmp_path / "data.csv"
+    write_csv(csv_path, [("repo-a", "old"), ("repo-b", "old")], header=("repo", "before"))
+
+    data = load_dataset(str(csv_path), cache_dir=str(tmp_path / "cache"))
+
+    assert [row["id"] for row in data] == ["1", "2"]
+
+
+def test_pickle_is_reused_until_the_csv_changes(tmp_path, fresh_process, monkeypatch):
+    csv_path, cache_dir = tmp_path / "data.csv", str(tmp_path / "cache")
+    write_csv(csv_path, [("1", "repo", "requests", "httpx", "old", "new")])
+    load_dataset(str(csv_path), cache_dir=cache_dir)
+    assert os.path.exists(dataset.cache_path_for(str(csv_path), cache_dir))
+
+    # A new process reads the pickle instead of parsing the CSV.
+    fresh_process()
+    parse_csv = dataset.parse_csv
+    monkeypatch.setattr(dataset, "parse_csv", lambda path: pytest.fail("the CSV was parsed again"))
+    assert load_dataset(str(csv_path), cache_dir=cache_dir)[0]["code_after"] == "new"
+
+    # Once the CSV changes, the stale pickle is rebuilt from it.
+    write_csv(csv_path, [("1", "repo", "requests", "httpx", "old", "newer"), ("2", "repo", "a", "b", "x", "y")])
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    monkeypatch.setattr(dataset, "parse_csv", parse_csv)
+    fresh_process()
+    data = load_dataset(str(csv_path), cache_dir=cache_dir)
+    assert len(data) == 2 and data[0]["code_after"] == "newer"
+
+    fresh_process()
+    monkeypatch.setattr(dataset, "parse_csv", lambda path: pytest.fail("the rebuilt pickle was not reused"))
+    assert len(load_dataset(str(csv_path), cache_dir=cache_dir)) == 2
@@ -0,0 +1,133 @@
+import difflib
+import random
+
+import pytest
+
+from diff_finder import (DIFF_BACKENDS, align_replace_block, calculate_similarity, difflib_opcodes,
+                         interned_opcodes, rapidfuzz_similarity, text_diff_analysis, text_diff_compact)
+
+OLD_CODE = "import requests\nr = requests.get(u)\nprint(r)\n"
+NEW_CODE = "import httpx\nr = httpx.get(u)\nprint(r)\nclose()\n"
+
+
+def assert_covers(aligned, n, m):
+    """Every line of both sides appears exactly once, in order."""
+    old = [i for i, _, _ in aligned if i is not None]
+    new = [j for _, j, _ in aligned if j is not None]
+    assert old == list(range(n))
+    assert new == list(range(m))
+
+
+def test_lopsided_block_pairs_modified_lines():
+    old = [f"value_{k} = compute({k}, timeout=10)" for k in range(20)]
+    new = []
+    for k in range(20):
+        new.append(f"value_{k} = compute({k}, timeout=30)")
+        new.append(f"log.debug('computed value {k}')")
+
+    aligned = align_replace_block(old, new)
+
+    assert [(i, j) for i, j, _ in aligned if i is not None and j is not None] == [(k, 2 * k) for k in range(20)]
+    assert_covers(aligned, len(old), len(new))
+
+
+def test_alignment_covers_both_sides_of_unequal_blocks():
+    rng = random.Random(0)
+    words = ["client", "session", "get", "post", "url", "data", "json", "headers", "timeout"]
+    for n, m in [(0, 5), (5, 0), (3, 40), (40, 3), (17, 23)]:
+        old = [" ".join(rng.choices(words, k=4)) for _ in range(n)]
+        new = [" ".join(rng.choices(words, k=4)) for _ in range(m)]
+        assert_covers(align_replace_block(old, new), n, m)
+
+
+def test_comparisons_stay_within_the_window():
+    calls = []
+
+    def counting_similarity(a, b, cutoff=None):
+        calls.append((a, b))
+        return calculate_similarity(a, b, cutoff)
+
+    old = [f"line {k}" for k in range(10)]
+    new = [f"other line {k}" for k in range(1000)]
+    align_replace_block(old, new, line_similarity=counting_similarity, window=8)
+
+    assert len(calls) <= len(old) * (2 * 8 + 1)
+
+
+def random_sides(rng, n):
+    lines = [f"line {k}" for k in range(8)] + ["", "    pass", "return x"]
+    a = rng.choices(lines, k=n)
+    b = [line for line in a if rng.random() > 0.2]
+    for _ in range(rng.randint(0, 5)):
+        b.insert(rng.randint(0, len(b)), rng.choice(lines))
+    return a, b
+
+
+@pytest.mark.parametrize("backend", sorted(DIFF_BACKENDS))
+def test_opcodes_rebuild_the_new_side(backend):
+    rng = random.Random(2)
+    for _ in range(200):
+        a, b = random_sides(rng, rng.randint(0, 30))
+        opcodes = DIFF_BACKENDS[backend](a, b)
+        rebuilt = []
+        i = j = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            assert (i1, j1) == (i, j)
+            if tag == "equal":
+                assert a[i1:i2] == b[j1:j2]
+            rebuilt.extend(b[j1:j2])
+            i, j = i2, j2
+        assert (i, j) == (len(a), len(b))
+        assert rebuilt == b
+
+
+def test_interned_opcodes_match_difflib():
+    rng = random.Random(3)
+    for _ in range(200):
+        a, b = random_sides(rng, rng.randint(0, 30))
+        assert interned_opcodes(a, b) == difflib_opcodes(a, b)
+
+
+def test_similarity_cutoff_only_drops_pairs_below_it():
+    pairs = [("requests.get(url)", "httpx.get(url)"), ("import requests", "import httpx"), ("abc", "xyz"), ("", "a")]
+    for a, b in pairs:
+        exact = difflib.SequenceMatcher(None, a, b).ratio() * 100 if a and b else 0.0
+        assert calculate_similarity(a, b) == pytest.approx(exact)
+        assert calculate_similarity(a, b, 50.0) == (pytest.approx(exact) if exact >= 50.0 else 0.0)
+
+
+def test_rapidfuzz_similarity_is_close_to_difflib():
+    pytest.importorskip("rapidfuzz")
+    for a, b in [("requests.get(url)", "httpx.get(url)"), ("import requests", "import httpx")]:
+        assert rapidfuzz_similarity(a, b) == pytest.approx(calculate_similarity(a, b), abs=10)
+
+
+def ratio(a, b):
+    return round(difflib.SequenceMatcher(None, a, b).ratio() * 100, 2)
+
+
+def test_diff_result_expands_to_the_documented_dicts():
+    assert text_diff_analysis(OLD_CODE, NEW_CODE) == [
+        {"old_index": 1, "new_index": 1, "line_old": "import requests", "line_new": "import httpx",
+         "absolute_diff": "modified", "similarity": ratio("import requests", "import httpx")},
+        {"old_index": 2, "new_index": 2, "line_old": "r = requests.get(u)", "line_new": "r = httpx.get(u)",
+         "absolute_diff": "modified", "similarity": ratio("r = requests.get(u)", "r = httpx.get(u)")},
+        {"old_index": 3, "new_index": 3, "line_old": "print(r)", "line_new": "print(r)",
+         "absolute_diff": "equal", "similarity": 100.0},
+        {"old_index": None, "new_index": 4, "line_old": None, "line_new": "close()",
+         "absolute_diff": "added", "similarity": 0.0},
+    ]
+
+
+@pytest.mark.parametrize("align", ["offset", "best"])
+def test_skip_equal_keeps_the_counts_and_the_changes(align):
+    rng = random.Random(4)
+    for _ in range(100):
+        a, b = random_sides(rng, rng.randint(0, 30))
+        old_text, new_text = "\n".join(a), "\n".join(b)
+        full = text_diff_compact(old_text, new_text, align=align)
+        changes = text_diff_compact(old_text, new_text, align=align, skip_equal=True)
+
+        assert changes.counts() == full.counts()
+        assert list(changes) == [item for item in full if item["absolute_diff"] != "equal"]
+        assert [full[k] for k in range(len(full))] == full.to_dicts()
@@ -0,0 +1,72 @@
+import httpx
+import ollama
+import pytest
+
+from conftest import migration_args
+from fake_llm_server import FakeLLMServer
+from models.generation_budget import ContextOverflowError
+from models.ollama_client import OllamaClient
+from models.response_cache import ResponseCache
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # A server without any model, so the first request has to pull it.
+    with FakeLLMServer(context_length=4096) as server:
+        monkeypatch.setattr(OllamaClient, "_local_models", None)
+        monkeypatch.setattr(OllamaClient, "_context_lengths", {})
+        yield server
+
+
+def make_client(server, timeout=None, **options):
+    client = OllamaClient(**options)
+    client.client = ollama.Client(host=server.url, timeout=timeout)
+    return client
+
+
+def test_context_comes_from_the_pulled_model(server):
+    client = make_client(server)
+
+    assert client.process(migration_args(), input_code="x = 1\n") == server.completion
+    assert server.counts["pull"] == 1
+    assert server.last_options["num_ctx"] <= 4096
+
+
+def test_oversized_prompt_is_refused_before_sending(server):
+    client = make_client(server)
+
+    with pytest.raises(ContextOverflowError):
+        client.process(migration_args(), input_code="value = 1\n" * 4000)
+    assert server.counts["pull"] == 1
+    assert "chat" not in server.counts
+
+
+def test_timeout_without_budget_is_reraised(server):
+    server.latency = 1.0
+    client = make_client(server, timeout=0.2, budget=False)
+
+    with pytest.raises(httpx.TimeoutException):
+        client.process(migration_args(), input_code="x = 1\n")
+
+
+def test_timed_requests_use_the_clients_host(server, monkeypatch):
+    # Nothing listens on OLLAMA_HOST; every request has to follow client.client.
+    monkeypatch.setenv("OLLAMA_HOST", "http://127.0.0.1:9")
+    client = make_client(server)
+
+    assert client.process(migration_args(), input_code="x = 1\n") == server.completion
+    assert server.counts["chat"] == 1
+
+
+def test_cached_rerun_does_not_reach_the_server(server, tmp_path, monkeypatch):
+    client = make_client(server)
+    client.cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    client.process(migration_args(), input_code="x = 1\n")
+
+    offline = OllamaClient()
+    offline.cache = client.cache
+    offline.client = ollama.Client(host="http://127.0.0.1:9")
+    monkeypatch.setattr(OllamaClient, "_local_models", None)
+    monkeypatch.setattr(OllamaClient, "_context_lengths", {})
+
+    assert offline.process(migration_args(), input_code="x = 1\n") == server.completion
@@ -0,0 +1,41 @@
+from get_codebleu_metric import SnippetIndex, find_snippet
+
+
+def make_folder(tmp_path, names):
+    for name in names:
+        (tmp_path / name).write_text("code\n", encoding="utf-8")
+    return SnippetIndex(str(tmp_path))
+
+
+def migration(row_id):
+    return {"id": row_id, "type": "call", "source_lib": "requests", "target_lib": "httpx"}
+
+
+def test_first_attempt_wins_over_duplicates(tmp_path):
+    index = make_folder(tmp_path, [
+        "python_requests_httpx1(2).txt", "python_requests_httpx1.txt", "python_requests_httpx1(1).txt",
+        "python_requests_httpx2(3).txt", "python_requests_httpx2(1).txt", "python_requests_httpx12.txt",
+        ".manifest.jsonl",
+    ])
+
+    assert index.lookup("python_requests_httpx1") == str(tmp_path / "python_requests_httpx1.txt")
+    assert index.lookup("python_requests_httpx2") == str(tmp_path / "python_requests_httpx2(1).txt")
+    assert index.duplicates == 3
+    # Ids are matched whole: 12 is its own snippet, not an attempt of 1.
+    assert index.lookup("python_requests_httpx12") == str(tmp_path / "python_requests_httpx12.txt")
+
+
+def test_find_snippet_falls_back_to_the_inverted_name(tmp_path):
+    index = make_folder(tmp_path, ["python_requests_httpx1.txt", "python_httpx_requests2.txt", "stray.txt"])
+
+    assert find_snippet(index, "zero_shot/repo", migration("1")).endswith("python_requests_httpx1.txt")
+    assert find_snippet(index, "zero_shot/repo", migration("2")).endswith("python_httpx_requests2.txt")
+    assert find_snippet(index, "zero_shot/repo", migration("3")) is None
+    assert index.unmatched() == ["stray"]
+
+
+def test_missing_folder_is_an_empty_index(tmp_path):
+    index = SnippetIndex(str(tmp_path / "missing"))
+
+    assert index.lookup("python_requests_httpx1") is None
+    assert index.unmatched() == []
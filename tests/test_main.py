@@ -0,0 +1,50 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from files import split_attempt
+from main import MANIFEST_NAME, save_result_to_file, write_new_output_file
+
+
+def test_split_attempt():
+    assert split_attempt("python_requests_httpx1") == ("python_requests_httpx1", 0)
+    assert split_attempt("python_requests_httpx1(12)") == ("python_requests_httpx1", 12)
+    assert split_attempt("name(x)") == ("name(x)", 0)
+
+
+def test_concurrent_writers_never_share_a_name(tmp_path):
+    (tmp_path / "example.py").write_text("existing\n", encoding="utf-8")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        paths = list(pool.map(lambda n: write_new_output_file(tmp_path, "example.py", f"{n}\n"), range(40)))
+
+    assert len(set(paths)) == 40
+    assert sorted(path.name for path in paths) == sorted(f"example({n}).py" for n in range(1, 41))
+    assert sorted(path.read_text(encoding="utf-8") for path in paths) == sorted(f"{n}\n" for n in range(40))
+
+
+def test_names_taken_by_another_process_are_skipped(tmp_path):
+    assert write_new_output_file(tmp_path, "example.py", "a").name == "example.py"
+    # Created behind this process's back, after it scanned the directory.
+    (tmp_path / "example(1).py").write_text("other process", encoding="utf-8")
+
+    assert write_new_output_file(tmp_path, "example.py", "b").name == "example(2).py"
+    assert (tmp_path / "example(1).py").read_text(encoding="utf-8") == "other process"
+
+
+def test_saves_are_logged_to_the_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    input_path = "input/python/requests/repo/example.py"
+
+    first = save_result_to_file(input_path, "python", "ollama", "fake-model", "print(1)\n", "zero_shot")
+    second = save_result_to_file(input_path, "python", "ollama", "fake-model",
+                                 "<think>hmm</think>\nprint(2)\n", "zero_shot")
+
+    output_dir = tmp_path / "output" / "python" / "ollama" / "fake-model" / "zero_shot" / "repo"
+    assert [first, second] == [str(output_dir.relative_to(tmp_path) / name)
+                               for name in ("example.py", "example(1).py")]
+    assert (output_dir / "example(1).py").read_text(encoding="utf-8") == "print(2)\n"
+    assert (output_dir / "raw" / "example(1).py").read_text(encoding="utf-8").startswith("<think>")
+    entries = [json.loads(line) for line in (output_dir / MANIFEST_NAME).read_text(encoding="utf-8").splitlines()]
+    assert [(entry["file"], entry["source"], entry["raw"]) for entry in entries] == [
+        ("example.py", "example.py", False), ("example(1).py", "example.py", True),
+    ]
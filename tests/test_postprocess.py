@@ -0,0 +1,64 @@
+from pathlib import Path
+
+import pytest
+
+from parser import extract_code
+from postprocess import PostProcessor
+from score_store import ScoreStore
+
+COMPLETION = "Here it is:\n```python\nimport httpx\nhttpx.get(url)\n```\n"
+REFERENCE = "import httpx\nhttpx.get(url)\n"
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # Saved paths are relative to the working directory, as main.py writes them.
+    monkeypatch.chdir(tmp_path)
+
+
+def saved_path(filename="python_requests_httpx1"):
+    return Path("output") / "python" / "ollama" / "fake-model" / "zero_shot" / "repo" / filename
+
+
+def migration(row_id="1"):
+    return {"migration_file": "test.csv", "id": row_id, "type": "call", "code_after": REFERENCE}
+
+
+def test_scores_are_in_the_store_before_close():
+    store_file = "scores.sqlite"
+    postprocessor = PostProcessor(score_store_file=store_file)
+
+    postprocessor.process(saved_path(), COMPLETION, migration())
+
+    # A sweep interrupted here has already saved the score.
+    store = ScoreStore(store_file)
+    try:
+        rows = store.load_results("ollama/fake-model")
+    finally:
+        store.close()
+    assert [(row["method"], row["id"]) for row in rows] == [("zero_shot/repo", "1")]
+    assert 0 < rows[0]["score"] <= 1
+    assert postprocessor.close() == 1
+
+
+def test_parsed_code_matches_parser_py():
+    parsed = PostProcessor().process(saved_path(), "<think>```\nnot this\n```</think>\n" + COMPLETION)
+
+    assert parsed == Path("parsed/python/ollama/fake-model/zero_shot/repo/python_requests_httpx1.txt")
+    assert parsed.read_text(encoding="utf-8") == extract_code(COMPLETION)
+
+
+def test_only_first_attempts_are_scored():
+    postprocessor = PostProcessor(score_store_file="scores.sqlite")
+
+    postprocessor.process(saved_path("python_requests_httpx1(1)"), COMPLETION, migration())
+    postprocessor.process(saved_path("python_requests_httpx2"), COMPLETION, migration("2"))
+    # Without a reference there is nothing to score against.
+    postprocessor.process(saved_path("python_requests_httpx3"), COMPLETION, {**migration("3"), "code_after": ""})
+
+    assert postprocessor.close() == 1
+    store = ScoreStore("scores.sqlite")
+    try:
+        assert [row["id"] for row in store.load_results("ollama/fake-model")] == ["2"]
+    finally:
+        store.close()
@@ -0,0 +1,37 @@
+import re
+
+import pytest
+
+from models.prompt_template import TEMPLATES_DIR, load_compiled_template
+
+VALUES = {
+    "LANGUAGE_NAME": "python", "OLD_LIB_NAME": "requests", "NEW_LIB_NAME": "httpx",
+    "CODE_BEFORE_MIGRATION": "import requests\n\ndef f(d={'a': 1}):\n    return requests.get('{url}')\n",
+}
+
+
+def legacy_prompt(name, **kwargs):
+    """The str.format + regex split the clients used before templates were compiled."""
+    formatted = (TEMPLATES_DIR / f"{name}.txt").read_text(encoding="utf-8").format(**kwargs)
+
+    def sections(flag):
+        return re.findall(rf"{{{flag}}}(.*?)[\r\n]*{{{flag}_END}}", formatted, re.DOTALL)
+
+    system, user = sections("SYSTEM_CONFIG"), sections("USER_CONFIG")
+    messages = [{"role": "system", "content": system[0]}, {"role": "user", "content": user[0]}]
+    if name == "one_shot":
+        messages += [{"role": "assistant", "content": sections("ASSISTANT_CONFIG")[0]},
+                     {"role": "user", "content": user[1]}]
+    return messages
+
+
+@pytest.mark.parametrize("name", ["zero_shot", "one_shot", "chain_of_thoughts"])
+def test_rendering_matches_str_format(name):
+    assert load_compiled_template(name).render(PROMPT=name, **VALUES) == legacy_prompt(name, PROMPT=name, **VALUES)
+
+
+def test_missing_variable_is_reported():
+    with pytest.raises(ValueError, match="CODE_BEFORE_MIGRATION"):
+        load_compiled_template("zero_shot").render(
+            PROMPT="zero_shot", LANGUAGE_NAME="python", OLD_LIB_NAME="requests", NEW_LIB_NAME="httpx"
+        )
@@ -0,0 +1,32 @@
+from models.response_cache import ResponseCache
+
+
+def stored_size(cache):
+    return cache._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_size_mb=3000 / (1024 * 1024))
+    for key in ("a", "b", "c"):
+        cache.put(key, "x" * 1000)
+    cache.get("a")
+    cache.put("d", "x" * 1000)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) for key in ("a", "c", "d"))
+    assert stored_size(cache) == 3000
+    cache.close()
+
+
+def test_running_total_follows_replacements_and_reopening(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    cache = ResponseCache(path)
+    cache.put("a", "x" * 100)
+    cache.put("a", "y" * 10)
+    cache.put("b", "z" * 50)
+    assert cache._total == stored_size(cache) == 60
+    cache.close()
+
+    reopened = ResponseCache(path)
+    assert reopened._total == 60
+    reopened.close()
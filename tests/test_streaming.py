@@ -0,0 +1,30 @@
+import random
+
+from models.streaming import CodeBlockScanner
+
+
+def scan(chunks):
+    scanner = CodeBlockScanner()
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.close()
+
+
+def test_fences_inside_think_are_ignored():
+    blocks, visible = scan(["<think>```\nnot code\n```</think>", "Answer:\n```python\nx = 1\n```\n"])
+
+    assert blocks == ["x = 1"]
+    assert visible == "Answer:\n\n"
+
+
+def test_chunking_does_not_change_the_result():
+    rng = random.Random(1)
+    pieces = ["```python\n", "x = 1\n", "```", "<think>", "</think>", "text ", "\n", "``", "`", "<thi", "nk>"]
+    for _ in range(500):
+        text = "".join(rng.choices(pieces, k=rng.randint(0, 30)))
+        chunks, i = [], 0
+        while i < len(text):
+            size = rng.randint(1, 7)
+            chunks.append(text[i:i + size])
+            i += size
+        assert scan(chunks) == scan([text]), text